@@ -11,14 +11,20 @@
             <li>Playlists (Selector) - per player (player-specific list)</li>
             <li>Sync / Unsync</li>
             <li>Favorites (Selector)</li>
-            <li>Display text (via Actions device)</li>
+            <li>Display text and RPC trace dump (via Actions device)</li>
             <li>Shuffle (Selector)</li>
             <li>Repeat (Selector)</li>
+            <li>Playback progress (Text)</li>
+            <li>Optional: play an artist / album / genre by name (Library Text device)</li>
         </ul>
         <br/><span style="font-weight: bold;">Lyrion Server settings</span>
     </description>
     <params>
-        <param field="Address" label="Server IP" width="200px" required="true" default="192.168.1.6"/>
+        <param field="Address" label="Server IP" width="200px" required="true" default="192.168.1.6">
+            <description>
+                <br/>Multiple servers: comma separated, optionally as Name=host:port (e.g. Home=192.168.1.6,Shed=192.168.2.6:9001)
+            </description>
+        </param>
         <param field="Port" label="Port" width="100px" required="true" default="9000"/>
         <param field="Username" label="Username" width="150px">
             <description>
@@ -60,9 +66,13 @@
         </param>
         <param field="Mode2" label="Max playlists to load" width="100px" default="5"/>
         <param field="Mode3" label="Debug logging" width="100px" default="False">
+            <description>
+                <br/>Profile: capture cProfile snapshots of poll cycles into the plugin folder (see settings.json)
+            </description>
             <options>
                 <option label="Off" value="False" default="true"/>
                 <option label="On" value="True"/>
+                <option label="Profile" value="Profile"/>
             </options>
         </param>
         <param field="Mode4" label="Message text" width="300px" default="Hello from Domoticz!" />
@@ -72,33 +82,1152 @@
 # Lyrion Music Server Domoticz Plugin
 
 import Domoticz
-import requests
 import time
 import re
+import os
+import json
+import base64
+import http.client
+import select
+import socket
+import threading
+import heapq
+import hashlib
+import itertools
+import bisect
+import difflib
+import unicodedata
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future
+
+# Optional tuning, read from settings.json in the plugin folder (re-read when the file changes)
+DEFAULT_SETTINGS = {
+    "profile_every": 10,         # profile every Nth poll cycle / command (0 = only slow cycles)
+    "profile_slow_cycle": 3.0,   # seconds; a slower cycle arms a capture of the next one
+    "profile_keep": 5,           # snapshots kept per kind
+    "transport": "stdlib",       # "stdlib" (default) or "requests"; read at start
+    "rate_limit": 5.0,           # LMS requests per second (0 = unlimited)
+    "rate_burst": 10,            # requests allowed back-to-back before rate_limit applies
+    "retry_attempts": 3,         # total tries for an idempotent player command
+    "retry_backoff": 0.2,        # seconds before the first retry, doubled per retry
+    "progress_step": 5,          # seconds between Progress device updates while playing
+    "artwork": False,            # show cover art in the Track device
+    "artwork_size": 150,         # thumbnail size requested from LMS (pixels, square)
+    "artwork_cache_mb": 20,      # on-disk cache size limit
+    "artwork_dir": "",           # cache folder, default <domoticz>/www/lyrion_art
+    "artwork_url": "/lyrion_art",  # URL under which the Domoticz web server serves artwork_dir
+    "display_duration": 60,      # seconds a display text stays on the player
+    "fade_seconds": 30,          # duration of the Fade in / Fade out actions
+    "history": False,            # record played tracks in history.log
+    "history_max_kb": 1024,      # rotate history.log above this size
+    "history_keep": 3,           # rotated history files kept
+    "library": False,            # keep a local index of artists/albums/genres for play-by-name
+    "library_page": 500,         # items fetched per library request
+    "state_file": "",            # publish player state as JSON ("" = off, "default" = <plugin folder>/state.json)
+    "discovery": False,          # probe the LMS UDP discovery port to notice a server coming back
+    "discovery_interval": 5,     # seconds between probes while a server is unreachable
+    "discovery_port": 3483,      # LMS discovery port
+    "discovery_broadcast": True,  # also broadcast probes, to find a server on a new address
+}
+
+
+# ----------------------------------------------------------------------
+# HTTP transports
+# ----------------------------------------------------------------------
+class TransportError(Exception):
+    """Network or HTTP level failure while talking to LMS"""
+
+    def __init__(self, msg, retryable=True, stale=False):
+        super().__init__(msg)
+        # Connection problems and 5xx replies may succeed on a retry, 4xx replies won't
+        self.retryable = retryable
+        # Reused keep-alive connection dropped after the request was written: LMS may
+        # or may not have handled it, so only a read-only query may simply be resent
+        self.stale = stale
+
+
+class StdlibTransport:
+    """Persistent keep-alive connection built on http.client (no third party imports)"""
+
+    name = "stdlib"
+
+    def __init__(self, host, port, auth=None, timeout=10):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.conn = None
+        self.headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if auth:
+            token = base64.b64encode(f"{auth[0]}:{auth[1]}".encode()).decode()
+            self.headers["Authorization"] = f"Basic {token}"
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, reason, headers, data) over the kept-alive connection"""
+        all_headers = dict(self.headers)
+        if headers:
+            all_headers.update(headers)
+
+        # A kept-alive connection may have been closed by the server in the meantime
+        if self.conn is not None and self.dropped():
+            self.close()
+
+        for attempt in range(2):
+            reused = self.conn is not None
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=all_headers)
+            except BrokenPipeError as e:
+                # Not written: safe to send again on a fresh connection, once
+                self.close()
+                if reused and attempt == 0:
+                    continue
+                raise TransportError(str(e)) from e
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                raise TransportError(str(e)) from e
+
+            try:
+                resp = self.conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError) as e:
+                # Written, so never resent here: the caller knows whether that is safe
+                self.close()
+                raise TransportError(str(e), stale=reused) from e
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                raise TransportError(str(e)) from e
+
+            if resp.will_close:
+                self.close()
+            return resp.status, resp.reason, resp.headers, data
+
+    def dropped(self):
+        """True when the server closed the idle connection (socket readable = EOF)"""
+        sock = self.conn.sock
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def post_json(self, path, payload):
+        """POST payload as JSON, return the decoded reply (ValueError on bad JSON)"""
+        status, reason, _, data = self.request("POST", path, json.dumps(payload).encode())
+        if status != 200:
+            raise TransportError(f"HTTP {status} {reason}", retryable=status >= 500)
+        return json.loads(data)
+
+    def get(self, path, headers=None):
+        """GET; returns (status, headers, body) for any HTTP status"""
+        status, _, resp_headers, data = self.request("GET", path, headers=headers)
+        return status, resp_headers, data
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class RequestsTransport:
+    """requests.Session based transport; requests is only imported when selected"""
+
+    name = "requests"
+
+    def __init__(self, host, port, auth=None, timeout=10):
+        import requests
+
+        self.requests = requests
+        self.base = f"http://{host}:{port}"
+        self.auth = auth
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def post_json(self, path, payload):
+        try:
+            r = self.http.post(self.base + path, json=payload, auth=self.auth, timeout=self.timeout)
+            r.raise_for_status()
+        except self.requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 500
+            raise TransportError(str(e), retryable=status >= 500) from e
+        except self.requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+        return r.json()
+
+    def get(self, path, headers=None):
+        try:
+            r = self.http.get(self.base + path, headers=headers, auth=self.auth, timeout=self.timeout)
+        except self.requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+        return r.status_code, r.headers, r.content
+
+    def close(self):
+        try:
+            self.http.close()
+        except Exception:
+            pass
+
+
+TRANSPORTS = {
+    StdlibTransport.name: StdlibTransport,
+    RequestsTransport.name: RequestsTransport,
+}
+
+
+# ----------------------------------------------------------------------
+# Cover art
+# ----------------------------------------------------------------------
+class ArtworkCache:
+    """Cover thumbnails on disk, least recently used evicted above max_bytes.
+
+    Entries are revalidated with If-None-Match / If-Modified-Since once they are
+    older than revalidate_after, so a cover shown by several (synced) players or
+    for a whole album is downloaded once.
+    """
+
+    INDEX = "index.json"
+
+    def __init__(self, folder, max_bytes, revalidate_after=86400):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.lock = threading.Lock()
+        self.index = OrderedDict()
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.folder, self.INDEX)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+        for entry in entries:
+            if os.path.exists(os.path.join(self.folder, entry.get("file", ""))):
+                self.index[entry["key"]] = entry
+
+    def save(self):
+        tmp = os.path.join(self.folder, self.INDEX + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(list(self.index.values()), f)
+        os.replace(tmp, os.path.join(self.folder, self.INDEX))
+
+    @staticmethod
+    def make_key(coverid, size):
+        safe = re.sub(r"[^A-Za-z0-9_-]", "", str(coverid))
+        if not safe or len(safe) > 40:
+            safe = hashlib.sha1(str(coverid).encode()).hexdigest()[:16]
+        return f"{safe}_{size}"
+
+    def lookup(self, key):
+        """File name of a cached cover (marks it as recently used), or None"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            self.index.move_to_end(key)
+            return entry["file"]
+
+    def fetch(self, key, path, get):
+        """Make sure key is cached; get(path, headers) does the HTTP GET"""
+        now = time.time()
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is not None and now - entry["checked"] < self.revalidate_after:
+                return entry["file"]
+            headers = {}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("modified"):
+                    headers["If-Modified-Since"] = entry["modified"]
+
+        status, resp_headers, body = get(path, headers)
+
+        with self.lock:
+            if status == 304 and entry is not None:
+                entry["checked"] = now
+                self.index.move_to_end(key)
+            elif status == 200 and body:
+                os.makedirs(self.folder, exist_ok=True)
+                name = key + ".jpg"
+                tmp = os.path.join(self.folder, name + ".tmp")
+                with open(tmp, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, os.path.join(self.folder, name))
+                self.index[key] = entry = {
+                    "key": key,
+                    "file": name,
+                    "size": len(body),
+                    "etag": resp_headers.get("ETag", ""),
+                    "modified": resp_headers.get("Last-Modified", ""),
+                    "checked": now,
+                }
+                self.index.move_to_end(key)
+                self.evict()
+            else:
+                return entry["file"] if entry is not None else None
+            self.save()
+            return entry["file"]
+
+    def evict(self):
+        total = sum(e["size"] for e in self.index.values())
+        while total > self.max_bytes and len(self.index) > 1:
+            _, old = self.index.popitem(last=False)
+            total -= old["size"]
+            try:
+                os.remove(os.path.join(self.folder, old["file"]))
+            except OSError:
+                pass
+
+
+class HistoryLog:
+    """Append-only now-playing log: one tab separated line per track change.
+
+    Lines are buffered and written in batches (no fsync per track); the file
+    is rotated to history.log.1 .. .N when it grows above max_bytes.
+    """
+
+    FIELDS = ("ts", "player", "artist", "title")
+
+    def __init__(self, path, max_bytes, keep, batch=20, flush_after=60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.batch = batch
+        self.flush_after = flush_after
+        self.buffer = []
+        self.first_buffered = 0
+
+    def record(self, player, artist, title):
+        if not self.buffer:
+            self.first_buffered = time.monotonic()
+        clean = [re.sub(r"[\t\r\n]+", " ", str(v)) for v in (player, artist, title)]
+        self.buffer.append(f"{int(time.time())}\t" + "\t".join(clean) + "\n")
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def flush_due(self):
+        if self.buffer and time.monotonic() - self.first_buffered >= self.flush_after:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        lines, self.buffer = self.buffer, []
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            size = f.tell()
+        if size > self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        for i in range(self.keep - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.keep > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def files(self):
+        """Oldest first, so the stream is in time order"""
+        rotated = [f"{self.path}.{i}" for i in range(self.keep, 0, -1)]
+        return [p for p in rotated + [self.path] if os.path.exists(p)]
+
+    def entries(self, player=None, since=0):
+        """Stream entries (dicts) from all files, one line at a time"""
+        for path in self.files():
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != len(self.FIELDS):
+                        continue
+                    entry = dict(zip(self.FIELDS, parts))
+                    if player and entry["player"] != player:
+                        continue
+                    try:
+                        if int(entry["ts"]) < since:
+                            continue
+                    except ValueError:
+                        continue
+                    yield entry
+
+    def top(self, player=None, n=5, since=0):
+        """(plays, top artists, top tracks) for one player (or all)"""
+        artists = Counter()
+        tracks = Counter()
+        plays = 0
+        for entry in self.entries(player, since):
+            plays += 1
+            if entry["artist"]:
+                artists[entry["artist"]] += 1
+            if entry["title"]:
+                tracks[(entry["artist"], entry["title"])] += 1
+        return plays, artists.most_common(n), tracks.most_common(n)
+
+
+class LibraryIndex:
+    """Artists, albums and genres of one LMS as (key, id, label) lists sorted by key.
+
+    Filled page by page by the plugin and swapped in when complete; revalidated
+    when the lastscan of the server changes. Saved to disk so a restart does not
+    re-read the library.
+    """
+
+    KINDS = ("album", "artist", "genre")
+    # Prefix / word matches looked at per lookup (the shortest one wins)
+    MATCH_LIMIT = 200
+
+    def __init__(self, path):
+        self.path = path
+        self.lastscan = None
+        self.items = {kind: [] for kind in self.KINDS}
+        self.keys = {kind: [] for kind in self.KINDS}
+        self.sorted_keys = {kind: [] for kind in self.KINDS}
+        self.words = {kind: ([], []) for kind in self.KINDS}
+        self.syncing = False
+
+    @staticmethod
+    def normalize(text):
+        text = unicodedata.normalize("NFKD", str(text))
+        text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+        text = " ".join(re.findall(r"[a-z0-9]+", text))
+        return text[4:] if text.startswith("the ") else text
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.replace(data["lastscan"], {kind: data["items"][kind] for kind in self.KINDS})
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"lastscan": self.lastscan, "items": self.items}, f)
+        os.replace(tmp, self.path)
+
+    def replace(self, lastscan, items):
+        """items: kind -> [(id, name, label)]; name is what is searched, label what is shown"""
+        built = {}
+        sorted_keys = {}
+        words = {}
+        for kind in self.KINDS:
+            rows = [(self.normalize(name), item_id, label) for item_id, name, label in items.get(kind, [])]
+            rows = sorted((r for r in rows if r[0]), key=lambda r: r[0])
+            built[kind] = rows
+            sorted_keys[kind] = [r[0] for r in rows]
+
+            # Every later word of a key ("road" for "abbey road"), sorted, so a word
+            # match is a bisect as well: (suffixes, row index per suffix)
+            suffixes = sorted(
+                (key[m.start():], i) for i, key in enumerate(sorted_keys[kind]) for m in re.finditer(r" (?=\S)", key)
+            )
+            words[kind] = ([w[1:] for w, _ in suffixes], [i for _, i in suffixes])
+
+        self.items = {kind: [list(item) for item in items.get(kind, [])] for kind in self.KINDS}
+        self.keys = built
+        self.sorted_keys = sorted_keys
+        self.words = words
+        self.lastscan = lastscan
+
+    def count(self):
+        return sum(len(rows) for rows in self.keys.values())
+
+    def lookup(self, kind, query):
+        """Best (rank, id, label) for query; rank 0 exact, 1 prefix, 2 word match, 3 fuzzy"""
+        rows = self.keys.get(kind) or []
+        q = self.normalize(query)
+        if not q or not rows:
+            return None
+
+        keys = self.sorted_keys[kind]
+        i = bisect.bisect_left(keys, q)
+        if i < len(rows) and keys[i] == q:
+            return 0, rows[i][1], rows[i][2]
+        prefix = []
+        while i < len(rows) and keys[i].startswith(q) and len(prefix) < self.MATCH_LIMIT:
+            prefix.append(rows[i])
+            i += 1
+        if prefix:
+            best = min(prefix, key=lambda r: len(r[0]))
+            return 1, best[1], best[2]
+
+        suffixes, index = self.words[kind]
+        i = bisect.bisect_left(suffixes, q)
+        matches = []
+        while i < len(suffixes) and suffixes[i].startswith(q) and len(matches) < self.MATCH_LIMIT:
+            matches.append(rows[index[i]])
+            i += 1
+        if matches:
+            best = min(matches, key=lambda r: len(r[0]))
+            return 2, best[1], best[2]
+
+        close = difflib.get_close_matches(q, keys, n=1, cutoff=0.75)
+        if close:
+            r = rows[bisect.bisect_left(keys, close[0])]
+            return 3, r[1], r[2]
+        return None
+
+
+class StatePublisher:
+    """Latest player state as a JSON file for scripts, rewritten atomically.
+
+    "version" goes up with every rewrite, which only happens when something
+    other than the running play position changed (or the player seeked).
+    """
+
+    SEEK_TOLERANCE = 3.0
+
+    def __init__(self, path):
+        self.path = path
+        self.players = {}
+        self.version = 0
+        self.dirty = True
+
+    def update(self, mac, state, position):
+        old = self.players.get(mac)
+        entry = dict(state, position=position)
+        if old is None or {k: v for k, v in old.items() if k != "position"} != state:
+            self.players[mac] = entry
+            self.dirty = True
+            return
+
+        # Same state: only a seek (the position is not where it was extrapolated to) counts
+        prev = old["position"]
+        expected = prev["elapsed"]
+        if state.get("mode") == "play" and state.get("power"):
+            expected += (position["at"] - prev["at"]) * prev["rate"]
+        if abs(expected - position["elapsed"]) > self.SEEK_TOLERANCE or prev["duration"] != position["duration"]:
+            self.players[mac] = entry
+            self.dirty = True
+
+    def remove(self, mac):
+        if self.players.pop(mac, None) is not None:
+            self.dirty = True
+
+    def publish(self):
+        if not self.dirty:
+            return
+        self.version += 1
+        data = {"version": self.version, "updated": round(time.time(), 3), "players": self.players}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+class DiscoveryProber:
+    """LMS UDP discovery ('e' request, 'E' reply with TLV fields) on a daemon thread.
+
+    targets() (called on the thread) returns the hosts to probe this round, an
+    empty list keeps it idle. Replies go to on_reply(ip, fields) on the thread.
+    """
+
+    PROBE = b"eIPAD\x00NAME\x00JSON\x00UUID\x00VERS\x00"
+
+    def __init__(self, targets, on_reply, port=3483, interval=5.0):
+        self.targets = targets
+        self.on_reply = on_reply
+        self.port = port
+        self.interval = interval
+        self.running = False
+        self.thread = None
+
+    @staticmethod
+    def parse(data):
+        """{'NAME': ..., 'JSON': '9000', ...} from a reply, None if it is not one"""
+        if not data.startswith(b"E"):
+            return None
+        fields = {}
+        i = 1
+        while i + 5 <= len(data):
+            tag = data[i:i + 4].decode("ascii", "replace")
+            length = data[i + 4]
+            fields[tag] = data[i + 5:i + 5 + length].decode("utf-8", "replace")
+            i += 5 + length
+        return fields
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="lms-discovery", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.settimeout(0.5)
+        next_probe = 0
+        try:
+            while self.running:
+                now = time.monotonic()
+                if now >= next_probe:
+                    next_probe = now + self.interval
+                    for host in self.targets():
+                        try:
+                            sock.sendto(self.PROBE, (host, self.port))
+                        except OSError:
+                            pass  # unreachable network / unresolvable name: next round
+                try:
+                    data, addr = sock.recvfrom(1500)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    time.sleep(0.5)
+                    continue
+                fields = self.parse(data)
+                if fields is not None:
+                    self.on_reply(addr[0], fields)
+        finally:
+            sock.close()
+
+
+# ----------------------------------------------------------------------
+# Servers
+# ----------------------------------------------------------------------
+class LMSServer:
+    """One LMS instance: its connection, I/O worker, health and poll schedule"""
+
+    def __init__(self, label, host, port, transport, scheduler):
+        self.label = label
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.scheduler = scheduler
+
+        # Health
+        self.online = None
+        self.last_success = 0
+
+        # Players as reported by serverstatus
+        self.players = []
+        self.players_ts = 0
+
+        # Players whose devices were provisioned (mac -> name) and the fingerprint
+        # of the player list they were provisioned for
+        self.provisioned = {}
+        self.players_fingerprint = None
+
+        # Local library index (settings.json "library"), loaded on first use
+        self.library = None
+
+        # UDP discovery: identity / resolved IP of the server and probes sent while it is online
+        self.uuid = None
+        self.address = None
+        self.uuid_probes = 0
+        self.resync_at = 0
+
+        # Favorites are global on an LMS, so cached per server (not per player)
+        self.favorites_cache = {"ts": 0, "data": []}
+
+        # Poll schedule
+        self.nextPoll = 0
+        self.cycle = None
+        self.repoll = False
+        self.any_active = False
+
+        # LMS update notification
+        self.update_notified = False
+        self.last_update_version = ""
+
+
+def parse_servers(address, default_port):
+    """Address field: 'host', 'host:port' or 'Name=host:port', comma separated"""
+    servers = []
+    for entry in address.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        label = None
+        if "=" in entry:
+            label, entry = (x.strip() for x in entry.split("=", 1))
+        host, _, port = entry.partition(":")
+        servers.append((label or host, host, int(port or default_port)))
+    return servers
+
+
+# ----------------------------------------------------------------------
+# Outgoing request scheduling
+# ----------------------------------------------------------------------
+LANE_HIGH = 0   # user commands (power/play/volume/...)
+LANE_LOW = 1    # background work (poll cycles, list refreshes)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = 0.0
+        self.burst = 1.0
+        self.tokens = None
+        self.stamp = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst):
+        self.rate = max(0.0, float(rate))
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst if self.tokens is None else min(self.tokens, self.burst)
+
+    def take(self):
+        """Take a token; returns 0 on success, otherwise the seconds until one is available"""
+        if self.rate <= 0:
+            return 0
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RetryPolicy:
+    """Which failed player commands may be sent again, and when"""
+
+    # Commands that queue/load music or step relative to the current state:
+    # sending them twice does something different than sending them once
+    NON_IDEMPOTENT = (
+        ("playlistcontrol",),
+        ("favorites", "playlist"),
+        ("playlist", "add"),
+        ("playlist", "insert"),
+        ("playlist", "play"),
+        ("playlist", "load"),
+        ("playlist", "addtracks"),
+        ("playlist", "loadtracks"),
+        ("playlist", "index"),
+        ("button",),
+    )
+
+    def __init__(self, attempts=3, backoff=0.2, max_delay=5.0):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+
+    def configure(self, attempts, backoff):
+        self.attempts = max(1, int(attempts))
+        self.backoff = max(0.0, float(backoff))
+
+    def is_idempotent(self, cmd_array):
+        words = [str(w) for w in cmd_array]
+        for prefix in self.NON_IDEMPOTENT:
+            if tuple(words[: len(prefix)]) == prefix:
+                return False
+        # Relative values ("mixer volume +5", "time -10") add up when repeated
+        return not any(len(w) > 1 and w[0] in "+-" and w[1].isdigit() for w in words[1:])
+
+    def should_retry(self, cmd_array, outcome, attempt):
+        # Bad JSON or a 4xx reply will not get better by asking again
+        return outcome == "neterror" and attempt < self.attempts and self.is_idempotent(cmd_array)
+
+    def delay(self, attempt):
+        return min(self.max_delay, self.backoff * (2 ** (attempt - 1)))
+
+
+class TimerQueue:
+    """Heap of pending timers (O(log n) add/pop); timers are grouped by owner for cancelling"""
+
+    def __init__(self):
+        self.heap = []
+        self.seq = itertools.count()
+        self.owners = {}
+
+    def add(self, delay, owner, fn, *args):
+        tid = next(self.seq)
+        heapq.heappush(self.heap, (time.monotonic() + delay, tid, owner, fn, args))
+        self.owners.setdefault(owner, set()).add(tid)
+        return tid
+
+    def cancel(self, owner):
+        """Cancel all timers of owner; their heap entries are skipped when they come up"""
+        return bool(self.owners.pop(owner, None))
+
+    def active(self, owner):
+        return bool(self.owners.get(owner))
+
+    def next_due(self):
+        """Seconds until the next timer, or None"""
+        while self.heap:
+            due, tid, owner, _, _ = self.heap[0]
+            if tid in self.owners.get(owner, ()):
+                return max(0.0, due - time.monotonic())
+            heapq.heappop(self.heap)
+        return None
+
+    def run_due(self):
+        now = time.monotonic()
+        while self.heap and self.heap[0][0] <= now:
+            _, tid, owner, fn, args = heapq.heappop(self.heap)
+            ids = self.owners.get(owner)
+            if not ids or tid not in ids:
+                continue
+            ids.discard(tid)
+            if not ids:
+                del self.owners[owner]
+            fn(*args)
+
+
+class _Job:
+    __slots__ = ("lane", "fn", "args", "key", "future")
+
+    def __init__(self, lane, fn, args, key):
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.future = Future()
+
+
+class CommandScheduler:
+    """Single I/O worker with a token bucket and two priority lanes.
+
+    Jobs run on the worker thread, interactive ones first. Every LMS request made
+    by a job passes gate(), which lets queued interactive jobs overtake a running
+    background job and waits for a token, so the plugin thread never blocks on it.
+    """
+
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.lanes = (deque(), deque())
+        self.keyed = {}
+        self.timers = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.local = threading.local()
+        self.thread = None
+        self.running = False
+        self.busy = False
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.worker, name="LMS I/O", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        with self.cond:
+            self.running = False
+            for lane in self.lanes:
+                while lane:
+                    lane.popleft().future.cancel()
+            for _, _, job in self.timers:
+                job.future.cancel()
+            self.timers = []
+            self.keyed.clear()
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def on_worker(self):
+        return threading.current_thread() is self.thread
+
+    def pending(self):
+        return self.busy or any(self.lanes) or bool(self.timers)
+
+    def submit(self, lane, fn, *args, key=None):
+        """Queue fn(*args) on the worker; a queued job with the same key is replaced"""
+        with self.cond:
+            if key is not None and key in self.keyed:
+                job = self.keyed[key]
+                job.fn = fn
+                job.args = args
+                return job.future
+
+            job = _Job(lane, fn, args, key)
+            if not self.running:
+                job.future.cancel()
+                return job.future
+            self.lanes[lane].append(job)
+            if key is not None:
+                self.keyed[key] = job
+            self.cond.notify()
+            return job.future
+
+    def submit_later(self, delay, lane, fn, *args):
+        """Queue fn(*args) after delay seconds without blocking anyone meanwhile"""
+        job = _Job(lane, fn, args, None)
+        with self.cond:
+            if not self.running:
+                job.future.cancel()
+                return job.future
+            heapq.heappush(self.timers, (time.monotonic() + delay, next(self.seq), job))
+            self.cond.notify()
+        return job.future
+
+    def release_timers(self):
+        """Move due delayed jobs into their lanes; returns seconds until the next one (or None)"""
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            job = heapq.heappop(self.timers)[2]
+            self.lanes[job.lane].append(job)
+        return self.timers[0][0] - now if self.timers else None
+
+    def call(self, lane, fn, *args, timeout=None):
+        """Run fn on the worker and wait for its result (inline when already on it)"""
+        if self.on_worker() or not self.running:
+            return fn(*args)
+        return self.submit(lane, fn, *args).result(timeout)
+
+    def gate(self):
+        if getattr(self.local, "lane", LANE_HIGH) == LANE_LOW:
+            self.run_pending(LANE_HIGH)
+
+        while self.running:
+            wait = self.bucket.take()
+            if not wait:
+                return
+            time.sleep(min(wait, 0.5))
+
+    def next_job(self, lane=None):
+        lanes = (lane,) if lane is not None else (LANE_HIGH, LANE_LOW)
+        for ln in lanes:
+            if self.lanes[ln]:
+                job = self.lanes[ln].popleft()
+                if job.key is not None:
+                    self.keyed.pop(job.key, None)
+                return job
+        return None
+
+    def run_pending(self, lane):
+        while True:
+            with self.cond:
+                job = self.next_job(lane)
+            if job is None:
+                return
+            self.execute(job)
+
+    def execute(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+
+        previous = getattr(self.local, "lane", LANE_HIGH)
+        self.local.lane = job.lane
+        try:
+            result = job.fn(*job.args)
+        except BaseException as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            self.local.lane = previous
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    wait = self.release_timers()
+                    if any(self.lanes):
+                        break
+                    self.cond.wait(wait)
+                if not self.running:
+                    return
+                job = self.next_job()
+                self.busy = True
+            try:
+                self.execute(job)
+            finally:
+                self.busy = False
+
+
+class CycleProfiler:
+    """Wraps poll cycles / commands with cProfile and writes rotated snapshots"""
+
+    def __init__(self, log):
+        self.log = log
+        self.enabled = False
+        self.folder = ""
+        self.every = DEFAULT_SETTINGS["profile_every"]
+        self.slow_cycle = DEFAULT_SETTINGS["profile_slow_cycle"]
+        self.keep = DEFAULT_SETTINGS["profile_keep"]
+        self.counters = {}
+        self.armed = set()
+        # run() is called from the plugin thread and every server's worker, but only
+        # one cProfile profiler can be active per process (Python 3.12+)
+        self.lock = threading.Lock()
+        self.capturing = False
+
+    def configure(self, enabled, folder, settings):
+        self.enabled = enabled
+        self.folder = folder
+        self.every = max(0, int(settings.get("profile_every", self.every)))
+        self.slow_cycle = float(settings.get("profile_slow_cycle", self.slow_cycle))
+        self.keep = max(1, int(settings.get("profile_keep", self.keep)))
+
+    def run(self, kind, fn, *args):
+        if not self.enabled:
+            return fn(*args)
+
+        with self.lock:
+            count = self.counters.get(kind, 0) + 1
+            self.counters[kind] = count
+            capture = not self.capturing and (kind in self.armed or (self.every and count % self.every == 0))
+            if capture:
+                self.capturing = True
+                self.armed.discard(kind)
+
+        if not capture:
+            started = time.time()
+            result = fn(*args)
+            elapsed = time.time() - started
+            if self.slow_cycle and elapsed > self.slow_cycle:
+                self.log(f"Slow {kind} ({elapsed:.2f}s), profiling the next one")
+                with self.lock:
+                    self.armed.add(kind)
+            return result
+
+        try:
+            # Imported lazily: only needed when profiling is switched on
+            import cProfile
+
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError as e:
+                # Another profiler (not ours) is active: run unprofiled
+                self.log(f"Could not profile {kind}: {e}")
+                return fn(*args)
+
+            started = time.time()
+            try:
+                return fn(*args)
+            finally:
+                prof.disable()
+                self.save(kind, count, prof, time.time() - started)
+        finally:
+            with self.lock:
+                self.capturing = False
+
+    def save(self, kind, count, prof, elapsed):
+        import io
+        import pstats
+
+        folder = os.path.join(self.folder, "profiles")
+        try:
+            os.makedirs(folder, exist_ok=True)
+            base = os.path.join(folder, f"{kind}_{time.strftime('%Y%m%d-%H%M%S')}_{count:06d}")
+            prof.dump_stats(base + ".prof")
+
+            out = io.StringIO()
+            out.write(f"{kind} took {elapsed:.3f}s\n\n")
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(30)
+            with open(base + ".txt", "w") as f:
+                f.write(out.getvalue())
+
+            self.rotate(folder, kind)
+            self.log(f"Profile of {kind} ({elapsed:.2f}s) written to {base}.prof")
+        except OSError as e:
+            self.log(f"Could not write profile: {e}")
+
+    def rotate(self, folder, kind):
+        snapshots = sorted(f[:-5] for f in os.listdir(folder) if f.startswith(kind + "_") and f.endswith(".prof"))
+        for old in snapshots[: -self.keep]:
+            for ext in (".prof", ".txt"):
+                try:
+                    os.remove(os.path.join(folder, old + ext))
+                except OSError:
+                    pass
 
 
 class LMSPlugin:
+    ACTIONS_LEVEL_NAMES = (
+        "None|SendText|Sync to this|Unsync|Dump RPC trace|Fade in|Fade out"
+        "|Sleep 15 min|Sleep 30 min|Sleep 60 min|Cancel timers|Listening stats"
+    )
+    # Actions level -> sleep timer minutes
+    SLEEP_LEVELS = {70: 15, 80: 30, 90: 60}
+
+    # Number of recent LMS exchanges kept in memory for the "Dump RPC trace" action
+    RPC_TRACE_SIZE = 50
+
+    # Song tags requested for the Track device (title is always included): a=artist
+    STATUS_TRACK_TAGS = "a"
+    # Extra tags when cover art is on: c=coverid, K=artwork_url (radio streams)
+    STATUS_ARTWORK_TAGS = "cK"
+
+    # Heartbeat while idle / while work is in flight (seconds)
+    HEARTBEAT = 5
+    FAST_HEARTBEAT = 1
+
+    # Device roles, in the order of the find_player_devices() tuple
+    ROLES = ("main", "volume", "track", "actions", "shuffle", "repeat", "playlists", "favorites", "progress")
+    ROLE_SUFFIXES = {
+        "volume": "Volume",
+        "track": "Track",
+        "actions": "Actions",
+        "shuffle": "Shuffle",
+        "repeat": "Repeat",
+        "playlists": "Playlists",
+        "favorites": "Favorites",
+        "progress": "Progress",
+    }
+    ROLE_HANDLERS = {
+        "main": "on_main_command",
+        "volume": "on_volume_command",
+        "track": "on_track_command",
+        "actions": "on_actions_command",
+        "shuffle": "on_shuffle_command",
+        "repeat": "on_repeat_command",
+        "playlists": "on_playlists_command",
+        "favorites": "on_favorites_command",
+        "progress": "on_track_command",
+    }
+    MAC_RE = re.compile(r"[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}")
+
+    # Setter commands where only the latest queued value matters
+    COALESCED_COMMANDS = {("mixer", "volume"), ("playlist", "shuffle"), ("playlist", "repeat")}
+
     def __init__(self):
-        self.url = ""
         self.auth = None
 
-        # Use a single session to reuse TCP connections (performance + fewer sockets)
-        self.http = requests.Session()
+        # One LMSServer per configured address, each with its own connection and I/O worker
+        self.servers = []
+        self.player_server = {}
 
         self.pollInterval = 30
         self.offlinePollInterval = 60
-        self.nextPoll = 0
+        self.heartbeat = None
+
+        # Domoticz API calls must come from the plugin thread; worker messages wait here
+        self.plugin_thread = threading.current_thread()
+        self.pending_logs = deque()
 
-        self.players = []
         self.max_playlists = 10
 
+        # Last known power state per player, decides how much status to request
+        self.player_power = {}
+
         self.imageID = 0
         self.debug = False
 
+        # settings.json (optional) + profiling
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings_file = ""
+        self.settings_mtime = None
+        self.profile_mode = False
+        self.profiler = CycleProfiler(self.log)
+
         # Display text settings
         self.displayText = ""           # Mode4: line2
         self.subjectText = "Lyrion"     # line1
-        self.displayDuration = 60
+        self.displayDuration = DEFAULT_SETTINGS["display_duration"]
+
+        # Timed player actions (fades, sleep timers, delayed display texts), run from onHeartbeat
+        self.timers = TimerQueue()
 
         # Logging / init
         self.initialized = False
@@ -106,36 +1235,108 @@ class LMSPlugin:
         # Track-change detection
         self.lastTrackIndex = {}
 
+        # Progress interpolation per player (see set_progress_anchor)
+        self.progress = {}
+        self.progress_step = DEFAULT_SETTINGS["progress_step"]
+
+        # Cover art cache, only when enabled in settings.json
+        self.artwork = None
+        self.artwork_size = DEFAULT_SETTINGS["artwork_size"]
+
+        # Listening history, only when enabled in settings.json
+        self.history = None
+
+        # Library index / play-by-name Text device, only when enabled in settings.json
+        self.library_enabled = False
+        self.library_page = DEFAULT_SETTINGS["library_page"]
+        self.library_unit = None
+        self.library_text = None
+        self.library_results = deque()
+
+        # Read-only state file for scripts, only when enabled in settings.json
+        self.state = None
+
+        # UDP discovery prober, only when enabled in settings.json
+        self.discovery = None
+        self.discovery_broadcast = True
+        self.discovery_interval = DEFAULT_SETTINGS["discovery_interval"]
+        self.discovery_replies = deque()
+
         # Server status tracking
-        self.server_was_online = None
-        self.last_success = 0
         self.offline_grace = 15
-        self.update_notified = False
-        self.last_update_version = ""
+
+        # Device table: unit -> (mac, role, handler) and mac -> units per role
+        self.unit_map = {}
+        self.player_units = {}
 
         # cache per speler
         self.playlist_cache = {}
 
-        # Favorites are global on LMS, so cache globally (not per player)
-        self.favorites_cache = {"ts": 0, "data": []}
+        # Playlists / favorites as last shown in each selector (unit -> list); commands
+        # resolve the selected level against this, never against a newer fetch
+        self.selector_lists = {}
+
+        # Per player fingerprint of the last applied status (see status_fingerprint)
+        self.status_fingerprints = {}
 
         self.listPollInterval = 600
 
-        # Flag of er een actieve speler is (play/pause)
-        self.any_active = False
+        # Ring buffer of the last RPC exchanges: (start, elapsed, server, player, cmd, outcome, result)
+        self.rpc_trace = deque(maxlen=self.RPC_TRACE_SIZE)
+
+        # Player command retries: (start, elapsed, player, cmd, attempt, outcome, retried)
+        self.retry_policy = RetryPolicy(DEFAULT_SETTINGS["retry_attempts"], DEFAULT_SETTINGS["retry_backoff"])
+        self.retry_trace = deque(maxlen=self.RPC_TRACE_SIZE)
+        self.latest_setting = {}
 
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
+    def emit(self, fn, msg):
+        if threading.current_thread() is self.plugin_thread:
+            fn(msg)
+        else:
+            self.pending_logs.append((fn, msg))
+
+    def flush_logs(self):
+        while self.pending_logs:
+            fn, msg = self.pending_logs.popleft()
+            fn(msg)
+
     def log(self, msg):
-        Domoticz.Log(msg)
+        self.emit(Domoticz.Log, msg)
 
-    def debug_log(self, msg):
-        if self.debug:
-            Domoticz.Debug("DEBUG: " + str(msg))
+    def debug_log(self, msg, *args):
+        """Log a debug message; %-style args are only formatted when debugging is on"""
+        if not self.debug:
+            return
+        if args:
+            msg = msg % args
+        self.emit(Domoticz.Debug, "DEBUG: " + str(msg))
+
+    def dump_rpc_trace(self):
+        if not self.rpc_trace:
+            self.log("RPC trace is empty.")
+            return
+
+        self.log(f"RPC trace, last {len(self.rpc_trace)} exchanges (oldest first):")
+        for started, elapsed, label, player, cmd_array, outcome, result in list(self.rpc_trace):
+            stamp = time.strftime("%H:%M:%S", time.localtime(started))
+            where = f"server={label} " if len(self.servers) > 1 else ""
+            detail = str(result)
+            if len(detail) > 200:
+                detail = detail[:200] + "..."
+            self.log(f" {stamp} {elapsed * 1000:7.1f}ms {outcome:<8} {where}player={player or '-'} cmd={cmd_array} {detail}")
+
+        if self.retry_trace:
+            self.log(f"Failed / retried player commands, last {len(self.retry_trace)}:")
+            for started, elapsed, player, cmd_array, attempt, outcome, retried in list(self.retry_trace):
+                stamp = time.strftime("%H:%M:%S", time.localtime(started))
+                next_step = "retry scheduled" if retried else "final"
+                self.log(f" {stamp} {elapsed * 1000:7.1f}ms attempt {attempt} {outcome:<9} player={player} cmd={cmd_array} ({next_step})")
 
     def error(self, msg):
-        Domoticz.Error(msg)
+        self.emit(Domoticz.Error, msg)
 
     def log_player(self, dev, action):
         if not dev:
@@ -144,14 +1345,203 @@ class LMSPlugin:
             name = dev.Name.replace(" Control", "")
         self.log(f"{name} | {action}")
 
-    @staticmethod
-    def is_main_device_name(name: str) -> bool:
-        return not any(x in name for x in ("Volume", "Track", "Actions", "Shuffle", "Repeat", "Playlists", "Favorites"))
+    def load_settings(self):
+        """(Re)load settings.json when it changed; missing file means defaults"""
+        try:
+            mtime = os.path.getmtime(self.settings_file)
+        except OSError:
+            mtime = None
+
+        if mtime == self.settings_mtime:
+            return
+        self.settings_mtime = mtime
+
+        settings = dict(DEFAULT_SETTINGS)
+        if mtime is not None:
+            try:
+                with open(self.settings_file) as f:
+                    user = json.load(f)
+                if isinstance(user, dict):
+                    settings.update(user)
+                    self.log(f"Settings loaded from {self.settings_file}")
+                else:
+                    self.error(f"{self.settings_file} must contain a JSON object, using defaults")
+            except (OSError, ValueError) as e:
+                self.error(f"Could not read {self.settings_file} ({e}), using defaults")
+
+        self.settings = settings
+        try:
+            self.profiler.configure(self.profile_mode, Parameters.get("HomeFolder", ""), settings)
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid profiling settings ({e})")
+        try:
+            for server in self.servers:
+                server.scheduler.bucket.configure(settings["rate_limit"], settings["rate_burst"])
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid rate limit settings ({e})")
+        try:
+            self.retry_policy.configure(settings["retry_attempts"], settings["retry_backoff"])
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid retry settings ({e})")
+        try:
+            self.progress_step = max(1, int(settings["progress_step"]))
+            self.displayDuration = max(1, int(settings["display_duration"]))
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid progress_step / display_duration ({e})")
+        self.configure_artwork(settings)
+        self.configure_history(settings)
+        self.configure_library(settings)
+        self.configure_state(settings)
+        self.configure_discovery(settings)
+
+    def configure_artwork(self, settings):
+        if not settings.get("artwork"):
+            self.artwork = None
+            return
+
+        folder = settings.get("artwork_dir") or os.path.join(Parameters.get("StartupFolder", ""), "www", "lyrion_art")
+        try:
+            self.artwork_size = int(settings["artwork_size"])
+            max_bytes = int(float(settings["artwork_cache_mb"]) * 1024 * 1024)
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid artwork settings ({e})")
+            self.artwork = None
+            return
+
+        if self.artwork is None or self.artwork.folder != folder:
+            self.artwork = ArtworkCache(folder, max_bytes)
+            self.log(f"Cover art enabled, cache in {folder}")
+        self.artwork.max_bytes = max_bytes
+
+    def configure_history(self, settings):
+        if not settings.get("history"):
+            if self.history is not None:
+                self.flush_history()
+            self.history = None
+            return
+
+        try:
+            max_bytes = int(float(settings["history_max_kb"]) * 1024)
+            keep = max(0, int(settings["history_keep"]))
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid history settings ({e})")
+            return
+
+        if self.history is None:
+            path = os.path.join(Parameters.get("HomeFolder", ""), "history.log")
+            self.history = HistoryLog(path, max_bytes, keep)
+            self.log(f"Listening history enabled, recorded in {path}")
+        self.history.max_bytes = max_bytes
+        self.history.keep = keep
+
+    def flush_history(self, force=True):
+        try:
+            if force:
+                self.history.flush()
+            else:
+                self.history.flush_due()
+        except OSError as e:
+            self.error(f"Could not write listening history ({e})")
+
+    def configure_library(self, settings):
+        try:
+            self.library_page = max(10, int(settings["library_page"]))
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid library_page ({e})")
+        self.library_enabled = bool(settings.get("library"))
+        if self.library_enabled:
+            self.ensure_library_device()
+
+    def configure_discovery(self, settings):
+        try:
+            port = int(settings["discovery_port"])
+            interval = max(1.0, float(settings["discovery_interval"]))
+        except (TypeError, ValueError) as e:
+            self.error(f"Invalid discovery settings ({e})")
+            return
+        self.discovery_broadcast = bool(settings.get("discovery_broadcast"))
+        self.discovery_interval = interval
+
+        if not settings.get("discovery"):
+            if self.discovery is not None:
+                self.discovery.stop()
+                self.discovery = None
+                self.discovery_replies.clear()
+            return
+
+        if self.discovery is not None and self.discovery.port != port:
+            self.discovery.stop()
+            self.discovery = None
+        if self.discovery is None:
+            self.discovery = DiscoveryProber(
+                self.discovery_targets, lambda ip, fields: self.discovery_replies.append((ip, fields)), port, interval
+            )
+            self.discovery.start()
+            self.log(f"Server discovery enabled (UDP port {port})")
+        self.discovery.interval = interval
+
+    def configure_state(self, settings):
+        path = settings.get("state_file") or ""
+        if path == "default":
+            path = os.path.join(Parameters.get("HomeFolder", ""), "state.json")
+        if not path:
+            self.state = None
+        elif self.state is None or self.state.path != path:
+            self.state = StatePublisher(path)
+            self.log(f"Player state published in {path}")
+
+    def publish_state(self):
+        try:
+            self.state.publish()
+        except OSError as e:
+            self.error(f"Could not write state file ({e})")
+
+    def log_listening_stats(self, history, mac, name):
+        """Runs on the low lane: streaming all history files may take a while"""
+        plays, artists, tracks = history.top(mac)
+        self.log(f"Listening stats for {name}: {plays} tracks played")
+        for artist, count in artists:
+            self.log(f" artist {count:5d}x {artist}")
+        for (artist, title), count in tracks:
+            self.log(f" track  {count:5d}x {artist} - {title}" if artist else f" track  {count:5d}x {title}")
+
+    def server_for(self, mac):
+        """Server a player was last seen on (first server when unknown)"""
+        return self.player_server.get(mac) or self.servers[0]
+
+    def server_name(self, server):
+        return f"Lyrion Music Server '{server.label}'" if len(self.servers) > 1 else "Lyrion Music Server"
+
+    def request_poll(self, mac, delay=1):
+        """Poll the player's server soon (after a command); never postpones an earlier poll"""
+        server = self.server_for(mac)
+        if server.cycle is not None:
+            server.repoll = True
+        else:
+            server.nextPoll = min(server.nextPoll, time.time() + delay)
+
+    def update_heartbeat(self):
+        """Fast heartbeat while a cycle or commands are in flight, slow when idle"""
+        now = time.time()
+        busy = any(
+            srv.cycle is not None or srv.scheduler.pending() or srv.nextPoll - now < self.HEARTBEAT
+            for srv in self.servers
+        )
+        if not busy and self.progress_step < self.HEARTBEAT:
+            busy = any(entry["playing"] for entry in self.progress.values())
+        if not busy:
+            due = self.timers.next_due()
+            busy = due is not None and due < self.HEARTBEAT
+        interval = self.FAST_HEARTBEAT if busy else self.HEARTBEAT
+        if interval != self.heartbeat:
+            Domoticz.Heartbeat(interval)
+            self.heartbeat = interval
 
     # ------------------------------------------------------------------
     # Domoticz lifecycle
     # ------------------------------------------------------------------
     def onStart(self):
+        self.plugin_thread = threading.current_thread()
         self.log(f"Starting Plugin version {Parameters['Version']}")
 
         _IMAGE = "LMS"
@@ -199,14 +1589,21 @@ class LMSPlugin:
         except (TypeError, ValueError):
             self.max_playlists = 50
 
-        # Debug logging (Mode3)
-        self.debug = Parameters.get("Mode3", "False").lower() == "true"
+        # Debug logging / profiling (Mode3)
+        mode3 = Parameters.get("Mode3", "False").lower()
+        self.debug = mode3 == "true"
+        self.profile_mode = mode3 == "profile"
         if self.debug:
             Domoticz.Debugging(1)
             self.log("Debug logging enabled")
         else:
             Domoticz.Debugging(0)
 
+        self.settings_file = os.path.join(Parameters.get("HomeFolder", ""), "settings.json")
+        self.load_settings()
+        if self.profile_mode:
+            self.log(f"Profiling enabled, snapshots in {os.path.join(Parameters.get('HomeFolder', ''), 'profiles')}")
+
         # Display text (Mode4)
         self.displayText = Parameters.get("Mode4", "")
 
@@ -216,102 +1613,360 @@ class LMSPlugin:
         )
         self.log("Starting initialization ...... Please wait")
 
-        # Server URL + Auth
-        self.url = f"http://{Parameters['Address']}:{Parameters['Port']}/jsonrpc.js"
+        # Server URL(s) + Auth
         user = Parameters.get("Username", "")
         pwd = Parameters.get("Password", "")
         self.auth = (user, pwd) if user else None
 
-        Domoticz.Heartbeat(5)
-        self.nextPoll = time.time() + 2
+        try:
+            addresses = parse_servers(Parameters["Address"], Parameters["Port"])
+        except ValueError as e:
+            self.error(f"Invalid server address '{Parameters['Address']}' ({e})")
+            addresses = []
+        if not addresses:
+            self.error("No Lyrion Music Server address configured.")
+            return
+
+        for label, host, port in addresses:
+            scheduler = CommandScheduler(self.settings["rate_limit"], self.settings["rate_burst"])
+            server = LMSServer(label, host, port, self.make_transport(host, port), scheduler)
+            self.servers.append(server)
+            scheduler.start()
+            server.nextPoll = time.time() + 2
+        if len(self.servers) > 1:
+            self.log(f"Servers: {', '.join(f'{s.label} ({s.host}:{s.port})' for s in self.servers)}")
+
+        self.rebuild_device_table()
+        self.update_heartbeat()
+
+    def make_transport(self, host, port):
+        transport_name = str(self.settings.get("transport", "stdlib")).lower()
+        transport_cls = TRANSPORTS.get(transport_name)
+        if transport_cls is None:
+            self.error(f"Unknown transport '{transport_name}', using stdlib")
+            transport_cls = StdlibTransport
+        try:
+            transport = transport_cls(host, port, self.auth)
+        except ImportError as e:
+            self.error(f"Transport '{transport_name}' not available ({e}), using stdlib")
+            transport = StdlibTransport(host, port, self.auth)
+        self.debug_log("Using %s transport for %s:%s", transport.name, host, port)
+        return transport
 
     def onStop(self):
+        if self.discovery is not None:
+            self.discovery.stop()
+        for server in self.servers:
+            server.scheduler.stop()
+        if self.history is not None:
+            self.flush_history()
+        self.flush_logs()
         self.log("Plugin stopped.")
-        try:
-            self.http.close()
-        except Exception:
-            pass
+        for server in self.servers:
+            server.transport.close()
+
+    def onDeviceRemoved(self, Unit):
+        self.selector_lists.pop(Unit, None)
+        entry = self.unit_map.get(Unit)
+        self.unregister_unit(Unit)
+        if entry is not None:
+            # Re-create the missing device on the next poll, like before
+            for server in self.servers:
+                if server.provisioned.pop(entry[0], None) is not None:
+                    server.players_fingerprint = None
 
     def onHeartbeat(self):
+        self.flush_logs()
+        self.load_settings()
+
+        # Every server has its own worker, so due servers are fetched concurrently
         now = time.time()
-        if now < self.nextPoll:
-            return
+        for server in self.servers:
+            if server.cycle is not None:
+                if server.cycle.done():
+                    self.finish_cycle(server)
+            elif now >= server.nextPoll:
+                plan = self.plan_cycle(server)
+                server.cycle = server.scheduler.submit(
+                    LANE_LOW, self.profiler.run, "fetch", self.fetch_cycle, server, plan
+                )
+
+        self.timers.run_due()
+        if self.discovery_replies:
+            self.handle_discovery()
+        if self.library_enabled:
+            self.check_library_request()
+        if self.library_results:
+            self.finish_library_requests()
+        if self.history is not None:
+            self.flush_history(force=False)
+        self.update_progress()
+        self.flush_logs()
+        self.update_heartbeat()
+
+    def finish_cycle(self, server):
+        cycle, server.cycle = server.cycle, None
+        try:
+            snapshot = cycle.result()
+        except Exception as e:
+            self.error(f"Poll cycle of {self.server_name(server)} failed: {e}")
+            snapshot = None
 
-        self.updateEverything()
+        self.profiler.run("cycle", self.apply_cycle, server, snapshot)
 
-        active = self.any_active
+        active = server.any_active
         interval = self.pollInterval if active else self.offlinePollInterval
+        if server.repoll:
+            interval = 1
+            server.repoll = False
 
-        self.debug_log(f"Heartbeat done, active={active}, next poll in {interval}s")
-        self.nextPoll = now + interval
+        self.debug_log("Cycle of %s done, active=%s, next poll in %ss", server.label, active, interval)
+        server.nextPoll = time.time() + interval
+
+    # ------------------------------------------------------------------
+    # DISCOVERY
+    # Probes go out on the prober thread only while a server is unreachable
+    # (or its identity is not known yet); replies are handled on the plugin thread
+    # ------------------------------------------------------------------
+    UUID_PROBES = 3
+
+    def discovery_targets(self):
+        targets = []
+        lost = False
+        for server in list(self.servers):
+            if server.address is None:
+                # Resolved here, not on the plugin thread: DNS may block
+                server.address = self.resolve(server.host)
+            if server.online is False:
+                lost = True
+                targets.append(server.host)
+            elif server.uuid is None and server.uuid_probes < self.UUID_PROBES:
+                # Learn the UUID while online, so the server is recognised on a new address
+                server.uuid_probes += 1
+                targets.append(server.host)
+        if lost and self.discovery_broadcast:
+            targets.append("<broadcast>")
+        return targets
+
+    def handle_discovery(self):
+        while self.discovery_replies:
+            ip, fields = self.discovery_replies.popleft()
+            uuid = fields.get("UUID") or None
+            server = next((s for s in self.servers if uuid and s.uuid == uuid), None)
+            if server is None:
+                server = next((s for s in self.servers if ip in (s.host, s.address)), None)
+            if server is None:
+                continue
+
+            if uuid and server.uuid is None:
+                server.uuid = uuid
+                self.debug_log("Discovery: %s is '%s' (%s)", server.label, fields.get("NAME", ""), uuid)
+
+            try:
+                port = int(fields.get("JSON") or server.port)
+            except ValueError:
+                port = server.port
+            if ip not in (server.host, server.address) or port != server.port:
+                self.log(f"{self.server_name(server)} moved from {server.host}:{server.port} to {ip}:{port}")
+                old = server.transport
+                server.host, server.port, server.address = ip, port, ip
+                server.transport = self.make_transport(ip, port)
+                server.scheduler.submit(LANE_HIGH, old.close)
+
+            if server.online is False:
+                self.resync_server(server)
+
+    @staticmethod
+    def resolve(host):
+        try:
+            return socket.gethostbyname(host)
+        except OSError:
+            return host
+
+    def resync_server(self, server):
+        """Server answers again: poll now, re-reading players and lists"""
+        now = time.time()
+        if now - server.resync_at < self.discovery_interval:
+            return
+        if now - server.resync_at > 60:
+            self.log(f"{self.server_name(server)} answers discovery again, resyncing")
+        else:
+            self.debug_log("%s answers discovery, still not reachable over HTTP", server.label)
+        server.resync_at = now
+        server.players_ts = 0
+        server.favorites_cache["ts"] = 0
+        for mac in server.provisioned:
+            self.playlist_cache.pop(mac, None)
+            self.status_fingerprints.pop(mac, None)
+        if server.cycle is not None:
+            server.repoll = True
+        else:
+            server.nextPoll = 0
+        self.update_heartbeat()
 
     # ------------------------------------------------------------------
     # LMS JSON helper
     # ------------------------------------------------------------------
-    def lms_query_raw(self, player, cmd_array):
+    def lms_query_raw(self, player, cmd_array, server=None):
+        # Only read-only queries come here, so a dropped keep-alive connection is just resent
+        return self.lms_request(player, cmd_array, server, resend_stale=True)[1]
+
+    def lms_request(self, player, cmd_array, server=None, resend_stale=False):
+        """One JSON-RPC exchange; returns (outcome, result), outcome one of
+        ok / neterror (retryable) / httperror (not retryable) / badjson.
+        Player commands leave resend_stale off: RetryPolicy decides on resending them"""
+        if server is None:
+            server = self.server_for(player)
+
+        scheduler = server.scheduler
+        if not scheduler.on_worker() and scheduler.running:
+            # Only the server's I/O worker talks to it; wait for it in the interactive lane
+            try:
+                return scheduler.call(LANE_HIGH, self.lms_request, player, cmd_array, server, resend_stale, timeout=30)
+            except Exception as e:
+                self.debug_log("LMS query via worker failed: %s", e)
+                return "neterror", None
+
+        scheduler.gate()
         data = {"id": 1, "method": "slim.request", "params": [player, cmd_array]}
+        started = time.time()
         try:
-            r = self.http.post(self.url, json=data, auth=self.auth, timeout=10)
-            r.raise_for_status()
-
             # JSON decoding can fail even if HTTP is 200 (e.g. proxy/HTML)
-            payload = r.json()
+            payload = server.transport.post_json("/jsonrpc.js", data)
 
             if not isinstance(payload, dict):
-                self.debug_log(f"LMS returned unexpected JSON type ({type(payload).__name__}): {payload}")
-                return None
+                self.rpc_trace.append((started, time.time() - started, server.label, player, cmd_array, "badjson", payload))
+                self.debug_log("LMS returned unexpected JSON type (%s): %s", type(payload).__name__, payload)
+                return "badjson", None
 
             result = payload.get("result")
-            self.debug_log(f"Query: player={player}, cmd={cmd_array}, result={result}")
-            self.last_success = time.time()
+            self.rpc_trace.append((started, time.time() - started, server.label, player, cmd_array, "ok", result))
+            self.debug_log("Query: player=%s, cmd=%s, result=%s", player, cmd_array, result)
+            server.last_success = time.time()
 
-            if self.server_was_online is not True:
-                if self.server_was_online is False:
-                    self.log("Lyrion Music Server is ONLINE.")
-                self.server_was_online = True
+            if server.online is not True:
+                if server.online is False:
+                    self.log(f"{self.server_name(server)} is ONLINE.")
+                server.online = True
 
-            return result
+            return "ok", result
 
-        except requests.exceptions.RequestException as e:
+        except TransportError as e:
             # Network/HTTP errors only
+            if resend_stale and e.stale:
+                self.rpc_trace.append((started, time.time() - started, server.label, player, cmd_array, "stale", e))
+                self.debug_log("Kept-alive connection dropped (%s), resending query", e)
+                return self.lms_request(player, cmd_array, server)
             now = time.time()
-            if self.server_was_online is not False:
-                if now - self.last_success > self.offline_grace:
-                    self.log(f"Lyrion Music Server is OFFLINE ({e})")
-                    self.server_was_online = False
+            outcome = "neterror" if e.retryable else "httperror"
+            self.rpc_trace.append((started, now - started, server.label, player, cmd_array, outcome, e))
+            if server.online is not False:
+                if now - server.last_success > self.offline_grace:
+                    self.log(f"{self.server_name(server)} is OFFLINE ({e})")
+                    server.online = False
 
-            self.debug_log(f"LMS query network/HTTP failed: {e}")
-            return None
+            self.debug_log("LMS query network/HTTP failed: %s", e)
+            return outcome, None
 
         except ValueError as e:
-            # JSON decode error from r.json()
-            self.debug_log(f"LMS returned invalid JSON: {e}")
-            return None
+            # JSON decode error
+            self.rpc_trace.append((started, time.time() - started, server.label, player, cmd_array, "badjson", e))
+            self.debug_log("LMS returned invalid JSON: %s", e)
+            return "badjson", None
+
+    def get_serverstatus(self, server, count=999):
+        """serverstatus; count=0 returns only the header (player count, newversion, ...)"""
+        return self.lms_query_raw("", ["serverstatus", 0, count], server)
+
+    def get_status(self, playerid, with_track=True, server=None):
+        """Player status; the current track (with only the tags we show) only when needed"""
+        if with_track:
+            tags = self.STATUS_TRACK_TAGS + (self.STATUS_ARTWORK_TAGS if self.artwork else "")
+            return self.lms_query_raw(playerid, ["status", "-", 1, f"tags:{tags}"], server)
+        return self.lms_query_raw(playerid, ["status", 0, 0], server)
+
+    # Maximum age of the player list; fetch_cycle re-reads it sooner on a rename or failure
+    PLAYERS_MAX_AGE = 300
+
+    def refresh_players(self, server, header, force=False):
+        """Fetch the full player list only when the player count changed or the list is old"""
+        now = time.time()
+        count = header.get("player count")
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = None
 
-    def get_serverstatus(self):
-        return self.lms_query_raw("", ["serverstatus", 0, 999])
+        max_age = min(self.listPollInterval, self.PLAYERS_MAX_AGE)
+        if not force and count == len(server.players) and now - server.players_ts < max_age:
+            return
 
-    def get_status(self, playerid):
-        return self.lms_query_raw(playerid, ["status", "-", 1, "tags:adclmntyK"])
+        if count == 0:
+            server.players = []
+            server.players_ts = now
+            return
 
-    def send_playercmd(self, playerid, cmd_array):
-        for attempt in range(2):
-            result = self.lms_query_raw(playerid, cmd_array)
-            if result is not None:
-                return result
-            time.sleep(0.2)
+        full = self.get_serverstatus(server, count or 999)
+        if not full:
+            return
+
+        server.players = full.get("players_loop", []) or []
+        server.players_ts = now
+        for p in server.players:
+            mac = p.get("playerid")
+            if not mac:
+                continue
+            self.player_server[mac] = server
+            if "power" in p:
+                self.player_power[mac] = int(p.get("power") or 0)
+
+    def coalesce_key(self, playerid, cmd_array):
+        if tuple(cmd_array[:2]) in self.COALESCED_COMMANDS:
+            return (playerid, cmd_array[0], cmd_array[1])
+        return None
+
+    def queue_playercmd(self, playerid, cmd_array):
+        """Send a user command through the interactive lane without waiting for it"""
+        key = self.coalesce_key(playerid, cmd_array)
+        if key is not None:
+            self.latest_setting[key] = cmd_array
+        scheduler = self.server_for(playerid).scheduler
+        return scheduler.submit(LANE_HIGH, self.send_playercmd, playerid, cmd_array, key=key)
+
+    def send_playercmd(self, playerid, cmd_array, attempt=1):
+        """Send a command once; a retryable failure of an idempotent command is re-queued with backoff"""
+        server = self.server_for(playerid)
+        started = time.time()
+        outcome, result = self.lms_request(playerid, cmd_array, server)
+        elapsed = time.time() - started
+
+        retry = outcome != "ok" and self.retry_policy.should_retry(cmd_array, outcome, attempt)
+        key = self.coalesce_key(playerid, cmd_array)
+        if retry and key is not None and self.latest_setting.get(key) is not cmd_array:
+            retry = False  # a newer value was queued meanwhile, don't resend the old one
+        if attempt > 1 or outcome != "ok":
+            self.retry_trace.append((started, elapsed, playerid, cmd_array, attempt, outcome, retry))
+
+        if not retry:
+            if outcome != "ok":
+                self.debug_log("Command %s for %s failed (%s) after %d attempt(s)", cmd_array, playerid, outcome, attempt)
+            return result
+
+        delay = self.retry_policy.delay(attempt)
+        self.debug_log("Command %s for %s failed (%s), retry %d in %.1fs", cmd_array, playerid, outcome, attempt, delay)
+        server.scheduler.submit_later(delay, LANE_HIGH, self.send_playercmd, playerid, cmd_array, attempt + 1)
         return None
 
     # ------------------------------------------------------------------
     # DISPLAY TEXT
     # ------------------------------------------------------------------
-    def send_display_text(self, playerid, line2_text):
+    def send_display_text(self, playerid, line2_text, duration=None):
         if not playerid or not line2_text:
             return
 
         line1 = self.subjectText[:64].replace('"', "'")
         line2 = line2_text[:128].replace('"', "'")
-        d = self.displayDuration
+        d = duration or self.displayDuration
 
         cmd = [
             "show",
@@ -322,57 +1977,107 @@ class LMSPlugin:
             "font:large",
         ]
 
-        self.send_playercmd(playerid, cmd)
+        self.queue_playercmd(playerid, cmd)
         self.log(f"Display text sent to {playerid}: '{line1}' / '{line2}' ({d}s)")
 
-    def find_player_devices(self, mac):
-        main = vol = text = actions = shuffle = repeat = playlistsel = favorites = None
+    # ------------------------------------------------------------------
+    # DEVICE TABLE
+    # unit -> (mac, role, handler), built once and kept up to date on create/remove
+    # ------------------------------------------------------------------
+    def device_role(self, dev):
+        """(mac, role) of a device: from its DeviceID when created by this version,
+        otherwise from Description and the name suffix given at creation"""
+        device_id = getattr(dev, "DeviceID", "") or ""
+        if "|" in device_id:
+            mac, role = device_id.rsplit("|", 1)
+            if role in self.ROLES:
+                return mac, role
 
-        # Eerst op Description (ideaal)
+        mac = dev.Description
+        if not mac:
+            # Very old devices: MAC only in the name
+            m = self.MAC_RE.search(dev.Name)
+            if not m:
+                return None, None
+            mac = m.group(0)
+
+        for role, suffix in self.ROLE_SUFFIXES.items():
+            if dev.Name.endswith(suffix):
+                return mac, role
+        return mac, "main"
+
+    def register_unit(self, unit, mac, role):
+        self.unit_map[unit] = (mac, role, getattr(self, self.ROLE_HANDLERS[role]))
+        units = self.player_units.setdefault(mac, [None] * len(self.ROLES))
+        units[self.ROLES.index(role)] = unit
+
+    def unregister_unit(self, unit):
+        entry = self.unit_map.pop(unit, None)
+        if entry is None:
+            return
+        units = self.player_units.get(entry[0])
+        if units is not None:
+            idx = self.ROLES.index(entry[1])
+            if units[idx] == unit:
+                units[idx] = None
+
+    def rebuild_device_table(self):
+        self.unit_map = {}
+        self.player_units = {}
         for uid, dev in Devices.items():
-            if dev.Description != mac:
-                continue
-            if dev.Name.endswith("Volume"):
-                vol = uid
-            elif dev.Name.endswith("Track"):
-                text = uid
-            elif dev.Name.endswith("Actions"):
-                actions = uid
-            elif dev.Name.endswith("Shuffle"):
-                shuffle = uid
-            elif dev.Name.endswith("Repeat"):
-                repeat = uid
-            elif dev.Name.endswith("Playlists"):
-                playlistsel = uid
-            elif dev.Name.endswith("Favorites"):
-                favorites = uid
-            else:
-                main = uid
+            mac, role = self.device_role(dev)
+            if mac:
+                self.register_unit(uid, mac, role)
 
-        # Fallback: als niets gevonden, probeer naamfragment
-        if not main:
-            for uid, dev in Devices.items():
-                if mac not in dev.Name:
-                    continue
-                if dev.Name.endswith("Volume"):
-                    vol = uid
-                elif dev.Name.endswith("Track"):
-                    text = uid
-                elif dev.Name.endswith("Actions"):
-                    actions = uid
-                elif dev.Name.endswith("Shuffle"):
-                    shuffle = uid
-                elif dev.Name.endswith("Repeat"):
-                    repeat = uid
-                elif dev.Name.endswith("Playlists"):
-                    playlistsel = uid
-                elif dev.Name.endswith("Favorites"):
-                    favorites = uid
-                else:
-                    main = uid
+    def sync_player_set(self, server, players):
+        """Provision devices only for players that appeared or were renamed;
+        devices of players that left the server are marked unavailable"""
+        current = {}
+        for p in players:
+            mac = p.get("playerid", "")
+            if mac:
+                name = p.get("name", "Unknown")
+                # Namen met serverprefix bij meerdere servers
+                current[mac] = f"{server.label} {name}" if len(self.servers) > 1 else name
+
+        fingerprint = hash(frozenset(current.items()))
+        if fingerprint == server.players_fingerprint:
+            return
+        server.players_fingerprint = fingerprint
+
+        for mac, name in current.items():
+            if server.provisioned.get(mac) == name:
+                continue
+            if mac in server.provisioned:
+                self.log(f"Player renamed: {server.provisioned[mac]} -> {name}")
+            self.ensure_player_devices(name, mac)
+            self.set_player_available(mac, True)
+            server.provisioned[mac] = name
+
+        for mac in [m for m in server.provisioned if m not in current]:
+            name = server.provisioned.pop(mac)
+            self.lastTrackIndex.pop(mac, None)
+            self.progress.pop(mac, None)
+            self.status_fingerprints.pop(mac, None)
+            if self.state is not None:
+                self.state.remove(mac)
+            # Player may have moved to another server, which then owns its devices
+            if self.player_server.get(mac, server) is server:
+                self.log(f"Player {name} ({mac}) is no longer on {self.server_name(server)}, devices marked unavailable")
+                self.set_player_available(mac, False)
+
+    def set_player_available(self, mac, available):
+        timed_out = 0 if available else 1
+        for unit in self.player_units.get(mac) or ():
+            if unit in Devices:
+                dev = Devices[unit]
+                if getattr(dev, "TimedOut", 0) != timed_out:
+                    dev.Update(nValue=dev.nValue, sValue=dev.sValue, TimedOut=timed_out)
 
-        if main:
-            return (main, vol, text, actions, shuffle, repeat, playlistsel, favorites)
+    def find_player_devices(self, mac):
+        units = self.player_units.get(mac)
+        if units and units[0]:
+            return tuple(units)
         return None
 
     def ensure_player_devices(self, name, mac):
@@ -380,9 +2085,9 @@ class LMSPlugin:
         devices = self.find_player_devices(mac)
 
         if not devices:
-            devices = (None, None, None, None, None, None, None, None)
+            devices = (None,) * len(self.ROLES)
 
-        main, vol, text, actions, shuffle, repeat, plsel, favsel = devices
+        main, vol, text, actions, shuffle, repeat, plsel, favsel, progress = devices
 
         used_units = set(Devices.keys())
         for u in devices:
@@ -412,11 +2117,12 @@ class LMSPlugin:
             }
             main_unit = require_unit(f"{name} Control")
             if main_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Control",
                 Unit=main_unit,
+                DeviceID=f"{mac}|main",
                 TypeName="Selector Switch",
                 Switchtype=18,
                 Options=opts_main,
@@ -424,6 +2130,7 @@ class LMSPlugin:
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(main_unit, mac, "main")
             main = main_unit
             self.log(f"Main device created for {name}")
 
@@ -431,16 +2138,18 @@ class LMSPlugin:
         if vol is None:
             vol_unit = require_unit(f"{name} Volume")
             if vol_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Volume",
                 Unit=vol_unit,
+                DeviceID=f"{mac}|volume",
                 TypeName="Dimmer",
                 Image=self.imageID,
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(vol_unit, mac, "volume")
             vol = vol_unit
             self.log(f"Volume device created for {name}")
 
@@ -448,33 +2157,42 @@ class LMSPlugin:
         if text is None:
             text_unit = require_unit(f"{name} Track")
             if text_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Track",
                 Unit=text_unit,
+                DeviceID=f"{mac}|track",
                 TypeName="Text",
                 Image=self.imageID,
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(text_unit, mac, "track")
             text = text_unit
             self.log(f"Track device created for {name}")
 
         # Actions
+        opts_act = {
+            "LevelNames": self.ACTIONS_LEVEL_NAMES,
+            "LevelActions": "|" * self.ACTIONS_LEVEL_NAMES.count("|"),
+            "SelectorStyle": "0",
+        }
+        if actions is not None and actions in Devices:
+            # Devices created by older versions miss the newer levels
+            dev_act = Devices[actions]
+            if dev_act.Options.get("LevelNames", "") != self.ACTIONS_LEVEL_NAMES:
+                dev_act.Update(nValue=dev_act.nValue, sValue=dev_act.sValue, Options=opts_act)
+
         if actions is None:
-            opts_act = {
-                "LevelNames": "None|SendText|Sync to this|Unsync",
-                "LevelActions": "|||",
-                "SelectorStyle": "0",
-            }
             act_unit = require_unit(f"{name} Actions")
             if act_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Actions",
                 Unit=act_unit,
+                DeviceID=f"{mac}|actions",
                 TypeName="Selector Switch",
                 Switchtype=18,
                 Options=opts_act,
@@ -482,6 +2200,7 @@ class LMSPlugin:
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(act_unit, mac, "actions")
             actions = act_unit
             self.log(f"Actions device created for {name}")
 
@@ -490,11 +2209,12 @@ class LMSPlugin:
             opts_shuffle = {"LevelNames": "Off|Songs|Albums", "LevelActions": "||", "SelectorStyle": "0"}
             sh_unit = require_unit(f"{name} Shuffle")
             if sh_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Shuffle",
                 Unit=sh_unit,
+                DeviceID=f"{mac}|shuffle",
                 TypeName="Selector Switch",
                 Switchtype=18,
                 Options=opts_shuffle,
@@ -502,6 +2222,7 @@ class LMSPlugin:
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(sh_unit, mac, "shuffle")
             shuffle = sh_unit
             self.log(f"Shuffle device created for {name}")
 
@@ -510,11 +2231,12 @@ class LMSPlugin:
             opts_repeat = {"LevelNames": "Off|Playlist|Track", "LevelActions": "||", "SelectorStyle": "0"}
             rep_unit = require_unit(f"{name} Repeat")
             if rep_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Repeat",
                 Unit=rep_unit,
+                DeviceID=f"{mac}|repeat",
                 TypeName="Selector Switch",
                 Switchtype=18,
                 Options=opts_repeat,
@@ -522,6 +2244,7 @@ class LMSPlugin:
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(rep_unit, mac, "repeat")
             repeat = rep_unit
             self.log(f"Repeat device created for {name}")
 
@@ -530,11 +2253,12 @@ class LMSPlugin:
             opts_pl = {"LevelNames": "Select|Loading...", "LevelActions": "", "SelectorStyle": "1"}
             pl_unit = require_unit(f"{name} Playlists")
             if pl_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Playlists",
                 Unit=pl_unit,
+                DeviceID=f"{mac}|playlists",
                 TypeName="Selector Switch",
                 Switchtype=18,
                 Options=opts_pl,
@@ -542,6 +2266,7 @@ class LMSPlugin:
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(pl_unit, mac, "playlists")
             plsel = pl_unit
             self.log(f"Playlists device created for {name}")
 
@@ -550,11 +2275,12 @@ class LMSPlugin:
             opts_fav = {"LevelNames": "Select|Loading...", "LevelActions": "", "SelectorStyle": "1"}
             fav_unit = require_unit(f"{name} Favorites")
             if fav_unit is None:
-                return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
             Domoticz.Device(
                 Name=f"{name} Favorites",
                 Unit=fav_unit,
+                DeviceID=f"{mac}|favorites",
                 TypeName="Selector Switch",
                 Switchtype=18,
                 Options=opts_fav,
@@ -562,16 +2288,36 @@ class LMSPlugin:
                 Description=mac,
                 Used=1,
             ).Create()
+            self.register_unit(fav_unit, mac, "favorites")
             favsel = fav_unit
             self.log(f"Favorites device created for {name}")
 
-        return (main, vol, text, actions, shuffle, repeat, plsel, favsel)
+        # Progress
+        if progress is None:
+            prog_unit = require_unit(f"{name} Progress")
+            if prog_unit is None:
+                return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
+
+            Domoticz.Device(
+                Name=f"{name} Progress",
+                Unit=prog_unit,
+                DeviceID=f"{mac}|progress",
+                TypeName="Text",
+                Image=self.imageID,
+                Description=mac,
+                Used=1,
+            ).Create()
+            self.register_unit(prog_unit, mac, "progress")
+            progress = prog_unit
+            self.log(f"Progress device created for {name}")
+
+        return (main, vol, text, actions, shuffle, repeat, plsel, favsel, progress)
 
     # ------------------------------------------------------------------
     # PLAYER-SPECIFIC PLAYLISTS
     # ------------------------------------------------------------------
     def get_player_playlists(self, mac):
-        result = self.send_playercmd(mac, ["playlists", 0, self.max_playlists])
+        result = self.lms_query_raw(mac, ["playlists", 0, self.max_playlists])
         if not result:
             return []
 
@@ -594,16 +2340,53 @@ class LMSPlugin:
         self.playlist_cache[mac] = {"ts": now, "data": playlists}
         return playlists
 
-    def get_cached_favorites(self, _mac_unused=None):
+    def get_cached_favorites(self, mac=None, server=None):
+        if server is None:
+            server = self.server_for(mac)
+
         now = time.time()
-        entry = self.favorites_cache
+        entry = server.favorites_cache
         if entry and now - entry["ts"] < self.listPollInterval:
             return entry["data"]
 
-        favorites = self.get_player_favorites()
-        self.favorites_cache = {"ts": now, "data": favorites}
+        favorites = self.get_player_favorites(server)
+        server.favorites_cache = {"ts": now, "data": favorites}
         return favorites
 
+    def play_list_item(self, kind, mac, idx):
+        """Worker: resolve a playlist / favorite level against a freshly fetched list and play it"""
+        if kind == "playlist":
+            items = self.get_cached_playlists(mac)
+        else:
+            items = self.get_cached_favorites(server=self.server_for(mac))
+        if not 0 <= idx < len(items):
+            self.error(f"Invalid {kind} index {idx + 1} ({len(items)} {kind}s loaded), nothing played on {mac}.")
+            return
+
+        item = items[idx]
+        if kind == "playlist":
+            cmd = ["playlistcontrol", "cmd:load", f"playlist_id:{item['id']}"]
+            self.log(f"Loaded playlist '{item['name']}' (ID {item['id']}) on player {mac}")
+        else:
+            cmd = ["favorites", "playlist", "play", f"item_id:{item['id']}"]
+            self.log(f"Playing Favorite: {item['name']}")
+        self.send_playercmd(mac, cmd)
+
+    def shown_list(self, unit, fallback):
+        """List behind the levels of a selector (stale or not); fallback before its first render"""
+        shown = self.selector_lists.get(unit)
+        return shown if shown is not None else fallback
+
+    def revalidate_lists(self, mac):
+        """Refresh expired list caches in the background; commands never wait for it"""
+        now = time.time()
+        server = self.server_for(mac)
+        entry = self.playlist_cache.get(mac)
+        if not entry or now - entry["ts"] >= self.listPollInterval:
+            server.scheduler.submit(LANE_LOW, self.get_cached_playlists, mac, key=("playlists", mac))
+        if now - server.favorites_cache["ts"] >= self.listPollInterval:
+            server.scheduler.submit(LANE_LOW, self.get_cached_favorites, None, server, key="favorites")
+
     def update_player_playlist_selector(self, plsel_unit, playlists, active_playlist_name=None):
         if plsel_unit not in Devices:
             return
@@ -625,6 +2408,7 @@ class LMSPlugin:
             dev_pl.Update(nValue=0, sValue=dev_pl.sValue, Options=opts)
             dev_pl = Devices[plsel_unit]
             self.log(f"Playlist selector updated for '{dev_pl.Name}'.")
+        self.selector_lists[plsel_unit] = playlists or []
 
         if active_playlist_name and playlists:
             for idx, pinfo in enumerate(playlists):
@@ -638,7 +2422,7 @@ class LMSPlugin:
             if dev_pl.sValue != "0":
                 dev_pl.Update(nValue=0, sValue="0")
 
-    def play_playlist_for_player(self, mac, Level):
+    def play_playlist_for_player(self, mac, Level, unit=None):
         if Level == 0:
             self.log("Playlist selection reset to 'Select'.")
             return
@@ -646,8 +2430,13 @@ class LMSPlugin:
         if Level < 10:
             return
 
-        playlists = self.get_cached_playlists(mac)
+        playlists = self.shown_list(unit, self.playlist_cache.get(mac, {}).get("data", []))
         idx = int(Level // 10) - 1
+        if not playlists:
+            # Nothing loaded yet (just started): fetch on the worker and play from there
+            self.server_for(mac).scheduler.submit(LANE_HIGH, self.play_list_item, "playlist", mac, idx)
+            return
+        self.revalidate_lists(mac)
         if idx < 0 or idx >= len(playlists):
             self.error("Invalid playlist index.")
             return
@@ -656,16 +2445,16 @@ class LMSPlugin:
         playlist_name = pl["name"]
         playlist_id = pl["id"]
 
-        self.send_playercmd(mac, ["playlistcontrol", "cmd:load", f"playlist_id:{playlist_id}"])
+        self.queue_playercmd(mac, ["playlistcontrol", "cmd:load", f"playlist_id:{playlist_id}"])
         self.log(f"Loaded playlist '{playlist_name}' (ID {playlist_id}) on player {mac}")
-        self.nextPoll = time.time() + 1
+        self.request_poll(mac, 1)
 
     # ------------------------------------------------------------------
     # FAVORITES
     # LMS favorites zijn globaal
     # ------------------------------------------------------------------
-    def get_player_favorites(self):
-        result = self.lms_query_raw("", ["favorites", "items", 0, 50])
+    def get_player_favorites(self, server):
+        result = self.lms_query_raw("", ["favorites", "items", 0, 50], server)
         if not result:
             return []
 
@@ -705,49 +2494,125 @@ class LMSPlugin:
         }
 
         if dev_fav.Options.get("LevelNames", "") != levelnames:
-            self.debug_log(f"Updating Favorites list. String length: {len(levelnames)}")
+            self.debug_log("Updating Favorites list. String length: %d", len(levelnames))
             dev_fav.Update(nValue=0, sValue=dev_fav.sValue, Options=opts)
+        self.selector_lists[fav_unit] = favorites[: levelnames.count("|")] if favorites else []
 
     # ------------------------------------------------------------------
     # MAIN UPDATE LOOP
+    # plan_cycle/apply_cycle run on the plugin thread (Devices), fetch_cycle on the I/O worker
     # ------------------------------------------------------------------
-    def updateEverything(self):
-        server = self.get_serverstatus()
-        if not server:
-            self.any_active = False
+    def plan_cycle(self, server):
+        """Which players want track info / lists, read from Devices before the fetch"""
+        track = {}
+        playlists = set()
+        favorites = False
+        # The state file and the listening history need the current song, also for
+        # players without a used Track device
+        all_tracks = self.state is not None or self.history is not None
+
+        for p in server.players:
+            mac = p.get("playerid")
+            if not mac:
+                continue
+
+            devices = self.find_player_devices(mac)
+            if not devices:
+                continue  # devices are created on apply; unknown players get everything
+
+            text, plsel, favsel = devices[2], devices[6], devices[7]
+            track[mac] = all_tracks or (text in Devices and bool(Devices[text].Used))
+            if plsel:
+                playlists.add(mac)
+            if favsel:
+                favorites = True
+
+        return {"track": track, "playlists": playlists, "favorites": favorites or not track}
+
+    def fetch_cycle(self, server, plan):
+        # Header only; the full player list is fetched when the player count changes,
+        # when it is old or when a player status does not match it (see fetch_statuses)
+        header = self.get_serverstatus(server, 0)
+        if not header:
+            return None
+
+        self.refresh_players(server, header)
+        players = list(server.players)
+        if self.library_enabled:
+            self.check_library(server, header)
+
+        statuses = {}
+        if not self.fetch_statuses(server, plan, players, statuses):
+            # A player was renamed, replaced or vanished at the same player count
+            self.debug_log("Player list of %s is outdated, re-reading it", server.label)
+            self.refresh_players(server, header, force=True)
+            players = list(server.players)
+            self.fetch_statuses(server, plan, [p for p in players if p.get("playerid") not in statuses], statuses)
+
+        if plan["favorites"]:
+            self.get_cached_favorites(server=server)
+
+        return {"server": header, "players": players, "status": statuses}
+
+    def fetch_statuses(self, server, plan, players, statuses):
+        """Fill statuses for players; False when the player list looks outdated"""
+        current = True
+        for p in players:
+            mac = p.get("playerid")
+            if not mac:
+                continue
+
+            known = mac in plan["track"]
+            wanted = plan["track"].get(mac, True)
+            with_track = wanted and self.player_power.get(mac, 1) == 1
+            st = self.get_status(mac, with_track, server) or {}
+            if not st or st.get("player_name", p.get("name")) != p.get("name"):
+                current = False
+
+            if st:
+                power = int(st.get("power", 0))
+                self.player_power[mac] = power
+                # Player was switched on since the last poll: fetch the track after all
+                if not with_track and wanted and power == 1 and st.get("mode") in ("play", "pause"):
+                    st = self.get_status(mac, True, server) or st
+            statuses[mac] = st
+            self.fetch_artwork(server, st)
+
+            if mac in plan["playlists"] or not known:
+                self.get_cached_playlists(mac)
+        return current
+
+    def apply_cycle(self, server, snapshot):
+        if not snapshot:
+            server.any_active = False
             return
 
-        self.players = server.get("players_loop", []) or []
+        players = snapshot["players"]
 
         # LMS update melding
-        update_msg = server.get("newversion", "")
+        update_msg = snapshot["server"].get("newversion", "")
         clean_msg = ""
         if update_msg:
             clean_msg = re.sub('<[^<]+?>', '', update_msg)
             clean_msg = clean_msg.split('Klik op hier')[0].strip()
-            if clean_msg and clean_msg != self.last_update_version:
+            if clean_msg and clean_msg != server.last_update_version:
                 try:
                     Domoticz.Status(f"{clean_msg}")
                 except Exception as e:
                     Domoticz.Error(f"Kon update notificatie niet versturen: {e}")
-                self.last_update_version = clean_msg
-                self.update_notified = True
+                server.last_update_version = clean_msg
+                server.update_notified = True
         else:
-            if self.update_notified:
-                self.last_update_version = ""
-                self.update_notified = False
+            if server.update_notified:
+                server.last_update_version = ""
+                server.update_notified = False
 
-        # Nieuwe spelers -> devices aanmaken
-        for p in self.players:
-            name = p.get("name", "Unknown")
-            mac = p.get("playerid", "")
-            if mac:
-                self.ensure_player_devices(name, mac)
+        self.sync_player_set(server, players)
 
         any_active = False
 
         # Alle spelers updaten
-        for p in self.players:
+        for p in players:
             mac = p.get("playerid")
             if not mac:
                 continue
@@ -756,8 +2621,8 @@ class LMSPlugin:
             if not devices:
                 continue
 
-            main, vol, text, actions, shuffle, repeat, plsel, favsel = devices
-            st = self.get_status(mac) or {}
+            main, vol, text, actions, shuffle, repeat, plsel, favsel, progress = devices
+            st = snapshot["status"].get(mac) or {}
 
             power = int(st.get("power", 0))
             mode = st.get("mode", "stop")
@@ -770,6 +2635,16 @@ class LMSPlugin:
 
             remote = st.get("remote", 0)
 
+            # Nothing changed since the last poll: only the position moved on
+            fingerprint = self.status_fingerprint(mac, st, clean_msg, devices, server)
+            if self.status_fingerprints.get(mac) == fingerprint:
+                if progress in Devices:
+                    self.set_progress_anchor(mac, progress, st, power, mode)
+                if self.state is not None:
+                    self.update_state(server, mac, st, power, mode)
+                continue
+            self.status_fingerprints[mac] = fingerprint
+
             # Main selector
             if main in Devices:
                 dev_main = Devices[main]
@@ -795,7 +2670,7 @@ class LMSPlugin:
             # Player-specific playlists
             player_pl = None
             if plsel:
-                player_pl = self.get_cached_playlists(mac)
+                player_pl = self.playlist_cache.get(mac, {}).get("data", [])
 
             # Track Text
             if text in Devices:
@@ -811,24 +2686,7 @@ class LMSPlugin:
                         self.update_player_playlist_selector(plsel, player_pl, active_playlist_name=None)
 
                 else:
-                    rm = st.get("remoteMeta", {})
-                    pl_loop = st.get("playlist_loop", []) or []
-
-                    current_title = st.get("current_title", "")
-                    title = ""
-                    artist = ""
-                    station = ""
-
-                    if remote == 1:
-                        station = current_title
-                        title = rm.get("title", "")
-                        artist = rm.get("artist", "")
-                    else:
-                        if pl_loop and isinstance(pl_loop, list):
-                            title = pl_loop[0].get("title", "")
-                            artist = pl_loop[0].get("artist", "")
-                        if not title:
-                            title = current_title
+                    station, artist, title = self.track_info(st)
 
                     lines = []
                     if station:
@@ -838,8 +2696,9 @@ class LMSPlugin:
                     if title and title != station:
                         lines.append(f"&#127925; <span style='color:#FFA500 !important;'>{title}</span>")
 
+                    art = self.artwork_html(st)
                     label = "<br>".join(lines) if lines else " "
-                    label = label[:255]
+                    label = art + label[: 255 - len(art)]
 
                     track_index = st.get("playlist_cur_index")
                     player_key = mac
@@ -849,10 +2708,16 @@ class LMSPlugin:
                         if player_key not in self.lastTrackIndex or self.lastTrackIndex[player_key] != track_index:
                             changed = True
                             self.lastTrackIndex[player_key] = track_index
+                            if self.history is not None and (title or station):
+                                self.history.record(mac, artist, title or station)
 
                     if dev_text.sValue != label or changed:
                         dev_text.Update(nValue=0, sValue=label)
 
+            # Progress: anchor for the local interpolation between polls
+            if progress in Devices:
+                self.set_progress_anchor(mac, progress, st, power, mode)
+
             # Shuffle
             if shuffle in Devices:
                 dev_shuffle = Devices[shuffle]
@@ -890,118 +2755,585 @@ class LMSPlugin:
                     self.update_player_playlist_selector(plsel, player_pl, active_playlist_name=None)
 
             if favsel:
-                favorites = self.get_cached_favorites(mac)
-                self.update_favorites_selector(favsel, favorites)
+                self.update_favorites_selector(favsel, server.favorites_cache["data"])
+
+            if self.state is not None:
+                self.update_state(server, mac, st, power, mode)
 
-        self.any_active = any_active
+        server.any_active = any_active
+        if self.state is not None:
+            self.publish_state()
 
         if not self.initialized:
             self.log("Initialization complete:")
-            self.log(f" Players              : {len(self.players)}")
+            self.log(f" Players              : {sum(len(srv.players) for srv in self.servers)}")
             self.log(f" Devices              : {len(Devices)}")
             self.log(f" Max playlists/player : {self.max_playlists}")
             self.initialized = True
 
+    # Status fields the devices are derived from; time / duration / rate only feed
+    # the Progress anchor and the state file, which are refreshed every poll anyway
+    FINGERPRINT_FIELDS = (
+        "power", "mode", "mixer volume", "remote", "current_title", "remoteMeta",
+        "playlist_loop", "playlist_cur_index", "playlist_tracks", "playlist_name",
+        "playlist shuffle", "playlist repeat", "artwork_url",
+    )
+
+    def status_fingerprint(self, mac, st, clean_msg, devices, server):
+        """Everything apply_cycle derives a player's devices from, except the time"""
+        return hash((
+            repr([st.get(k) for k in self.FINGERPRINT_FIELDS]),
+            clean_msg,
+            devices,
+            self.playlist_cache.get(mac, {}).get("ts"),
+            server.favorites_cache["ts"],
+            self.artwork_html(st) if self.artwork is not None else "",
+        ))
+
+    def update_state(self, server, mac, st, power, mode):
+        station, artist, title = self.track_info(st)
+        try:
+            volume = int(float(str(st.get("mixer volume", 0)).replace("%", "")))
+        except (TypeError, ValueError):
+            volume = 0
+
+        state = {
+            "name": server.provisioned.get(mac, mac),
+            "server": server.label,
+            "power": power,
+            "mode": mode,
+            "volume": volume,
+            "station": station,
+            "artist": artist,
+            "title": title,
+            "playlist": st.get("playlist_name", "") or "",
+            "shuffle": int(st.get("playlist shuffle", 0) or 0),
+            "repeat": int(st.get("playlist repeat", 0) or 0),
+            "sync_master": st.get("sync_master", ""),
+        }
+        try:
+            position = {
+                "elapsed": round(float(st.get("time", 0) or 0), 1),
+                "duration": round(float(st.get("duration", 0) or 0), 1),
+                "rate": float(st.get("rate", 1) or 1),
+                "at": round(time.time(), 3),
+            }
+        except (TypeError, ValueError):
+            position = {"elapsed": 0.0, "duration": 0.0, "rate": 1.0, "at": round(time.time(), 3)}
+        self.state.update(mac, state, position)
+
+    def track_info(self, st):
+        """(station, artist, title) of the current song"""
+        rm = st.get("remoteMeta", {}) or {}
+        pl_loop = st.get("playlist_loop", []) or []
+
+        current_title = st.get("current_title", "")
+        title = ""
+        artist = ""
+        station = ""
+
+        if st.get("remote", 0) == 1:
+            station = current_title
+            title = rm.get("title", "")
+            artist = rm.get("artist", "")
+        else:
+            if pl_loop and isinstance(pl_loop, list):
+                title = pl_loop[0].get("title", "")
+                artist = pl_loop[0].get("artist", "")
+            if not title:
+                title = current_title
+        return station or "", artist or "", title or ""
+
     # ------------------------------------------------------------------
-    # COMMAND HANDLER
+    # COVER ART
     # ------------------------------------------------------------------
-    def onCommand(self, Unit, Command, Level, Hue):
-        if Unit not in Devices:
+    def artwork_source(self, st):
+        """(cache key, LMS path) of the current cover, or (None, None)"""
+        pl_loop = st.get("playlist_loop") or []
+        coverid = pl_loop[0].get("coverid") if pl_loop and isinstance(pl_loop[0], dict) else None
+        size = self.artwork_size
+        if coverid:
+            return ArtworkCache.make_key(coverid, size), f"/music/{coverid}/cover_{size}x{size}"
+
+        # Radio streams: only artwork served by LMS itself (imageproxy etc.)
+        url = st.get("artwork_url") or (pl_loop[0].get("artwork_url") if pl_loop else None)
+        if url and url.startswith("/"):
+            return ArtworkCache.make_key(url, size), url
+        return None, None
+
+    def fetch_artwork(self, server, st):
+        """Worker side: download / revalidate the cover of a status"""
+        cache = self.artwork
+        if cache is None or not st:
+            return
+        key, path = self.artwork_source(st)
+        if key is None:
             return
 
-        self.nextPoll = time.time() + 1
+        def get(p, headers):
+            server.scheduler.gate()
+            return server.transport.get(p, headers)
 
-        dev = Devices[Unit]
-        devname = dev.Name
-        mac = dev.Description
-
-        if not mac:
-            self.error(f"No MAC address for device {Unit} ('{devname}'), command ignored.")
-            return
+        try:
+            cache.fetch(key, path, get)
+        except (TransportError, OSError) as e:
+            self.debug_log("Cover art %s not fetched: %s", path, e)
+
+    def artwork_html(self, st):
+        if self.artwork is None:
+            return ""
+        key, _ = self.artwork_source(st)
+        name = self.artwork.lookup(key) if key else None
+        if not name:
+            return ""
+        base = str(self.settings.get("artwork_url", "/lyrion_art")).rstrip("/")
+        return f"<img src='{base}/{name}' height=48 align=left>"
 
-        self.debug_log(f"onCommand: Unit={Unit}, Name={devname}, Command={Command}, Level={Level}, mac={mac}")
+    # ------------------------------------------------------------------
+    # LIBRARY
+    # Index synced on the I/O worker (one low lane job per page); requests are
+    # written to the "Lyrion Library" Text device and resolved on the plugin thread
+    # ------------------------------------------------------------------
+    LIBRARY_QUERIES = {
+        "artist": (["artists"], "artists_loop", "artist"),
+        "album": (["albums"], "albums_loop", "album"),
+        "genre": (["genres"], "genres_loop", "genre"),
+    }
 
-        if "Favorites" in devname and Command == "Set Level":
-            if Level == 0:
-                dev.Update(nValue=0, sValue="0")
+    def ensure_library_device(self):
+        for uid, dev in Devices.items():
+            if getattr(dev, "DeviceID", "") == "library":
+                self.library_unit = uid
                 return
 
-            favorites = self.get_cached_favorites(mac)
-            svalue = str(Level)
-            idx = (int(svalue) // 10) - 1
+        free = [u for u in range(1, 256) if u not in Devices]
+        if not free:
+            self.error("No free Domoticz units available (1..255). Cannot create device 'Lyrion Library'.")
+            return
+        Domoticz.Device(
+            Name="Lyrion Library",
+            Unit=free[0],
+            DeviceID="library",
+            TypeName="Text",
+            Image=self.imageID,
+            Used=1,
+        ).Create()
+        self.library_unit = free[0]
+        self.library_text = ""
+        self.log("Library device created")
+
+    def library_path(self, server):
+        name = "library.json" if len(self.servers) <= 1 else f"library-{re.sub(r'[^A-Za-z0-9_-]', '_', server.label)}.json"
+        return os.path.join(Parameters.get("HomeFolder", ""), name)
+
+    def check_library(self, server, header):
+        """Worker: start a sync when the library was rescanned since the index was built"""
+        if server.library is None:
+            server.library = LibraryIndex(self.library_path(server))
+            server.library.load()
+            if server.library.lastscan is not None:
+                self.log(f"Library index loaded: {server.library.count()} items")
+
+        lastscan = str(header.get("lastscan", ""))
+        if server.library.syncing or lastscan == server.library.lastscan:
+            return
+        server.library.syncing = True
+        self.log(f"Library of {self.server_name(server)} changed, updating index")
+        staging = {kind: [] for kind in LibraryIndex.KINDS}
+        server.scheduler.submit(LANE_LOW, self.sync_library_page, server, lastscan, staging, 0, 0)
+
+    def sync_library_page(self, server, lastscan, staging, kind_idx, start):
+        """Worker: fetch one page, queue the next one (so polls and commands go in between)"""
+        library = server.library
+        kind = LibraryIndex.KINDS[kind_idx]
+        base, loop, field = self.LIBRARY_QUERIES[kind]
+        cmd = base + [start, self.library_page] + (["tags:la"] if kind == "album" else [])
+
+        result = self.lms_query_raw("", cmd, server)
+        if result is None:
+            library.syncing = False  # retried on a later poll
+            return
 
-            if 0 <= idx < len(favorites):
-                fav = favorites[idx]
-                fav_id = fav["id"]
-                self.send_playercmd(mac, ["favorites", "playlist", "play", f"item_id:{fav_id}"])
-                self.log(f"Playing Favorite: {fav['name']}")
-                dev.Update(nValue=1, sValue=svalue, Options=dev.Options)
+        rows = result.get(loop, []) or []
+        for row in rows:
+            name = row.get(field, "")
+            label = f"{name} - {row['artist']}" if kind == "album" and row.get("artist") else name
+            if name and "id" in row:
+                staging[kind].append((row["id"], name, label))
 
-            self.nextPoll = time.time() + 1
+        start += len(rows)
+        if rows and start < int(result.get("count", 0) or 0):
+            server.scheduler.submit(LANE_LOW, self.sync_library_page, server, lastscan, staging, kind_idx, start)
+            return
+        if kind_idx + 1 < len(LibraryIndex.KINDS):
+            server.scheduler.submit(LANE_LOW, self.sync_library_page, server, lastscan, staging, kind_idx + 1, 0)
             return
 
-        if "Playlists" in devname and Command == "Set Level":
-            if Level == 0:
-                dev.Update(nValue=0, sValue="0")
-                return
-            self.play_playlist_for_player(mac, Level)
+        library.replace(lastscan, staging)
+        library.syncing = False
+        try:
+            library.save()
+        except OSError as e:
+            self.error(f"Could not save library index ({e})")
+        self.log("Library index updated: " + ", ".join(f"{len(staging[k])} {k}s" for k in LibraryIndex.KINDS))
+
+    def check_library_request(self):
+        """A new text in the Library device is a request like 'album abbey road @ kitchen'"""
+        unit = self.library_unit
+        if unit not in Devices:
+            return
+        text = Devices[unit].sValue or ""
+        if self.library_text is None:
+            self.library_text = text  # what was there before the plugin started
+            return
+        if text == self.library_text or not text.strip():
             return
 
-        if "Actions" in devname and Command == "Set Level":
-            self.handle_actions(dev, mac, Level)
+        reply = self.play_by_name(text)
+        if reply is None:
+            reply = f"Searching: {text}"
+        else:
+            self.log(f"Library: '{text}' -> {reply}")
+        self.library_text = reply
+        Devices[unit].Update(nValue=0, sValue=reply)
+
+    def play_by_name(self, text):
+        """Reply text, or None when the lookup was queued (answered by finish_library_requests)"""
+        query, _, player = text.partition("@")
+        kind, _, name = query.strip().partition(" ")
+        if kind.lower() in LibraryIndex.KINDS:
+            kinds = (kind.lower(),)
+        else:
+            kinds, name = LibraryIndex.KINDS, query.strip()
+
+        mac = self.library_player(player.strip())
+        if mac is None:
+            return f"Unknown player '{player.strip()}'" if player.strip() else "No players"
+
+        library = self.server_for(mac).library
+        if library is None or library.lastscan is None:
+            return "Library index not ready yet"
+
+        # The fuzzy fallback scans the whole index: not on the plugin thread
+        self.server_for(mac).scheduler.submit(LANE_LOW, self.lookup_library, library, text, mac, kinds, name)
+        return None
+
+    def lookup_library(self, library, text, mac, kinds, name):
+        """Worker: best match over the kinds; on equal rank the order of KINDS decides"""
+        matches = [(m, kind) for kind in kinds for m in [library.lookup(kind, name)] if m]
+        best = min(matches, key=lambda m: m[0][0]) if matches else None
+        self.library_results.append((text, mac, name, best))
+
+    def finish_library_requests(self):
+        while self.library_results:
+            text, mac, name, best = self.library_results.popleft()
+            if best is None:
+                reply = f"Not found: {name.strip()}"
+            else:
+                (_, item_id, label), kind = best
+                self.queue_playercmd(mac, ["playlistcontrol", "cmd:load", f"{kind}_id:{item_id}"])
+                self.progress_event(mac, "play")
+                self.request_poll(mac, 1)
+                reply = f"\u25B6 {label} ({self.library_player_name(mac)})"
+
+            self.log(f"Library: '{text}' -> {reply}")
+            if self.library_unit in Devices and Devices[self.library_unit].sValue == self.library_text:
+                # Only overwrite our own "Searching" text, not a newer request
+                self.library_text = reply
+                Devices[self.library_unit].Update(nValue=0, sValue=reply)
+
+    def library_player_name(self, mac):
+        for server in self.servers:
+            if mac in server.provisioned:
+                return server.provisioned[mac]
+        return mac
+
+    def library_player(self, name):
+        """Player by (prefix of) its name; without a name the one playing, else the first"""
+        players = [(mac, n) for server in self.servers for mac, n in server.provisioned.items()]
+        if not players:
+            return None
+        if name:
+            q = LibraryIndex.normalize(name)
+            for mac, n in players:
+                if LibraryIndex.normalize(n) == q:
+                    return mac
+            for mac, n in players:
+                if LibraryIndex.normalize(n).startswith(q) or f" {q}" in f" {LibraryIndex.normalize(n)}":
+                    return mac
+            return None
+        for mac, _ in players:
+            entry = self.progress.get(mac)
+            if entry and entry["playing"]:
+                return mac
+        return players[0][0]
+
+    # ------------------------------------------------------------------
+    # TIMED ACTIONS
+    # Steps run from onHeartbeat via self.timers and only queue commands
+    # ------------------------------------------------------------------
+    FADE_STEP = 1.0
+
+    def current_volume(self, mac):
+        units = self.find_player_devices(mac)
+        if units and units[1] in Devices:
+            try:
+                return int(Devices[units[1]].sValue or 0)
+            except ValueError:
+                pass
+        return 0
+
+    def set_volume(self, mac, level):
+        self.queue_playercmd(mac, ["mixer", "volume", str(int(level))])
+
+    def start_fade(self, mac, fade_in, duration=None, then=None):
+        """Ramp the volume up from 0 (and start playing) or down to 0 (then pause)"""
+        self.timers.cancel((mac, "fade"))
+        duration = duration or float(self.settings.get("fade_seconds", 30) or 30)
+        volume = self.current_volume(mac)
+
+        if fade_in:
+            target = volume or 30
+            self.set_volume(mac, 0)
+            self.queue_playercmd(mac, ["play"])
+            self.progress_event(mac, "play")
+            start = 0
+        else:
+            target = 0
+            start = volume
+
+        self.log(f"Fade {'in' if fade_in else 'out'} on {mac}: {start}% -> {target or 0}% in {duration:.0f}s")
+        self.fade_step(mac, start, target, volume, time.monotonic(), duration, then)
+
+    def fade_step(self, mac, start, target, restore, t0, duration, then):
+        frac = min(1.0, (time.monotonic() - t0) / duration) if duration > 0 else 1.0
+        self.set_volume(mac, round(start + (target - start) * frac))
+        if frac < 1.0:
+            self.timers.add(self.FADE_STEP, (mac, "fade"), self.fade_step, mac, start, target, restore, t0, duration, then)
             return
 
-        if "Shuffle" in devname:
-            if Command == "Set Level":
-                mode = int(Level // 10)
-            elif Command == "Off":
-                mode = 0
-                Level = 0
+        if target == 0:
+            # Faded out: stop (or power off), then put the volume back for the next play.
+            # Restore later, otherwise it coalesces with the pending 0% step
+            if then == "off":
+                self.queue_playercmd(mac, ["power", "0"])
+                self.progress_event(mac, "off")
             else:
-                return
+                self.queue_playercmd(mac, ["pause", "1"])
+                self.progress_event(mac, "pause")
+            self.timers.add(2 * self.FADE_STEP, (mac, "fade"), self.set_volume, mac, restore)
+        self.request_poll(mac, 1)
+
+    def start_sleep_timer(self, mac, minutes):
+        self.timers.cancel((mac, "sleep"))
+        delay = minutes * 60
+        fade = float(self.settings.get("fade_seconds", 30) or 30)
+
+        self.send_display_text(mac, f"Sleep timer: {minutes} min", duration=10)
+        if delay > 60:
+            self.timers.add(delay - 60, (mac, "sleep"), self.send_display_text, mac, "Sleeping in 1 minute", 10)
+        self.timers.add(max(0, delay - fade), (mac, "sleep"), self.start_fade, mac, False, fade, "off")
+        self.log(f"Sleep timer set for {mac}: power off in {minutes} min")
 
-            self.send_playercmd(mac, ["playlist", "shuffle", str(mode)])
-            nval = 1 if mode > 0 else 0
-            dev.Update(nValue=nval, sValue=str(Level))
-            mode_name = {0: "Off", 1: "Songs", 2: "Albums"}.get(mode, f"Unknown ({mode})")
-            self.log_player(dev, f"Shuffle {mode_name}")
+    # ------------------------------------------------------------------
+    # PROGRESS
+    # Interpolated locally from the last polled time/duration/rate; no extra requests
+    # ------------------------------------------------------------------
+    @staticmethod
+    def format_clock(seconds):
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+    def set_progress_anchor(self, mac, unit, st, power, mode):
+        try:
+            elapsed = float(st.get("time", 0) or 0)
+            duration = float(st.get("duration", 0) or 0)
+            rate = float(st.get("rate", 1) or 1)
+        except (TypeError, ValueError):
+            elapsed, duration, rate = 0.0, 0.0, 1.0
+
+        self.progress[mac] = {
+            "unit": unit,
+            "elapsed": elapsed,
+            "duration": duration,
+            "rate": rate,
+            "playing": power == 1 and mode == "play",
+            "visible": power == 1 and mode in ("play", "pause"),
+            "at": time.monotonic(),
+        }
+        self.render_progress(mac)
+
+    def progress_event(self, mac, mode):
+        """A command changed the play state: re-anchor without waiting for the poll"""
+        entry = self.progress.get(mac)
+        if entry is None:
             return
 
-        if "Repeat" in devname:
-            if Command == "Set Level":
-                cmd_map = {0: 0, 10: 2, 20: 1}
-                mode = cmd_map.get(Level, 0)
-            elif Command == "Off":
-                mode = 0
-                Level = 0
+        now = time.monotonic()
+        if entry["playing"]:
+            entry["elapsed"] += (now - entry["at"]) * entry["rate"]
+        entry["at"] = now
+        entry["playing"] = mode == "play"
+        entry["visible"] = mode in ("play", "pause")
+        if mode == "stop":
+            entry["elapsed"] = 0.0
+        self.render_progress(mac)
+
+    def render_progress(self, mac):
+        entry = self.progress.get(mac)
+        if entry is None or entry["unit"] not in Devices:
+            return
+
+        label = ""
+        if entry["visible"]:
+            elapsed = entry["elapsed"]
+            if entry["playing"]:
+                elapsed += (time.monotonic() - entry["at"]) * entry["rate"]
+            duration = entry["duration"]
+            if duration > 0:
+                elapsed = min(elapsed, duration)
+
+            # Quantize so Domoticz is only written once per progress_step
+            step = self.progress_step
+            elapsed = int(elapsed // step) * step
+
+            if duration > 0:
+                pct = int(elapsed * 100 // duration)
+                label = f"{self.format_clock(elapsed)} / {self.format_clock(duration)} ({pct}%)"
             else:
-                return
+                label = self.format_clock(elapsed)
 
-            self.send_playercmd(mac, ["playlist", "repeat", str(mode)])
-            nval = 1 if mode > 0 else 0
-            dev.Update(nValue=nval, sValue=str(Level))
+        dev = Devices[entry["unit"]]
+        if dev.sValue != label:
+            dev.Update(nValue=0, sValue=label)
 
-            mode_name = {0: "Off", 1: "Track", 2: "Playlist"}.get(mode, f"Unknown ({mode})")
-            self.log_player(dev, f"Repeat set to {mode_name}")
+    def update_progress(self):
+        for mac, entry in self.progress.items():
+            if entry["playing"]:
+                self.render_progress(mac)
+
+    # ------------------------------------------------------------------
+    # COMMAND HANDLER
+    # ------------------------------------------------------------------
+    def onCommand(self, Unit, Command, Level, Hue):
+        self.profiler.run("command", self.dispatch_command, Unit, Command, Level, Hue)
+        self.update_heartbeat()
+
+    def dispatch_command(self, Unit, Command, Level, Hue):
+        if Unit not in Devices:
             return
 
-        if Command in ["On", "Off"] and self.is_main_device_name(devname):
-            self.handle_power(dev, mac, Command)
+        entry = self.unit_map.get(Unit)
+        if entry is None:
+            # Device not seen yet (e.g. restored by the user): index it now
+            mac, role = self.device_role(Devices[Unit])
+            if mac:
+                self.register_unit(Unit, mac, role)
+            entry = self.unit_map.get(Unit)
+
+        dev = Devices[Unit]
+        if entry is None:
+            self.error(f"No MAC address for device {Unit} ('{dev.Name}'), command ignored.")
             return
 
-        if "Volume" in devname and Command == "Set Level":
-            self.handle_volume(dev, mac, Level)
+        mac, role, handler = entry
+        self.debug_log("onCommand: Unit=%s, Role=%s, Command=%s, Level=%s, mac=%s", Unit, role, Command, Level, mac)
+        # The device may now show the requested value; re-apply the next status even if unchanged
+        self.status_fingerprints.pop(mac, None)
+        self.request_poll(mac, 1)
+        handler(dev, mac, Command, Level)
+
+    def on_favorites_command(self, dev, mac, Command, Level):
+        if Command != "Set Level":
             return
 
-        if Command == "Set Level" and self.is_main_device_name(devname):
-            self.handle_main_playback(dev, mac, Level)
+        if Level == 0:
+            dev.Update(nValue=0, sValue="0")
+            return
+
+        favorites = self.shown_list(dev.Unit, self.server_for(mac).favorites_cache["data"])
+        svalue = str(Level)
+        idx = (int(svalue) // 10) - 1
+        if not favorites:
+            # Nothing loaded yet (just started): fetch on the worker and play from there
+            self.server_for(mac).scheduler.submit(LANE_HIGH, self.play_list_item, "favorite", mac, idx)
+            dev.Update(nValue=1, sValue=svalue, Options=dev.Options)
+            return
+        self.revalidate_lists(mac)
+
+        if 0 <= idx < len(favorites):
+            fav = favorites[idx]
+            fav_id = fav["id"]
+            self.queue_playercmd(mac, ["favorites", "playlist", "play", f"item_id:{fav_id}"])
+            self.log(f"Playing Favorite: {fav['name']}")
+            dev.Update(nValue=1, sValue=svalue, Options=dev.Options)
+
+    def on_playlists_command(self, dev, mac, Command, Level):
+        if Command != "Set Level":
+            return
+
+        if Level == 0:
+            dev.Update(nValue=0, sValue="0")
             return
+        self.play_playlist_for_player(mac, Level, dev.Unit)
+
+    def on_actions_command(self, dev, mac, Command, Level):
+        if Command == "Set Level":
+            self.handle_actions(dev, mac, Level)
+
+    def on_shuffle_command(self, dev, mac, Command, Level):
+        if Command == "Set Level":
+            mode = int(Level // 10)
+        elif Command == "Off":
+            mode = 0
+            Level = 0
+        else:
+            return
+
+        self.queue_playercmd(mac, ["playlist", "shuffle", str(mode)])
+        nval = 1 if mode > 0 else 0
+        dev.Update(nValue=nval, sValue=str(Level))
+        mode_name = {0: "Off", 1: "Songs", 2: "Albums"}.get(mode, f"Unknown ({mode})")
+        self.log_player(dev, f"Shuffle {mode_name}")
+
+    def on_repeat_command(self, dev, mac, Command, Level):
+        if Command == "Set Level":
+            cmd_map = {0: 0, 10: 2, 20: 1}
+            mode = cmd_map.get(Level, 0)
+        elif Command == "Off":
+            mode = 0
+            Level = 0
+        else:
+            return
+
+        self.queue_playercmd(mac, ["playlist", "repeat", str(mode)])
+        nval = 1 if mode > 0 else 0
+        dev.Update(nValue=nval, sValue=str(Level))
+
+        mode_name = {0: "Off", 1: "Track", 2: "Playlist"}.get(mode, f"Unknown ({mode})")
+        self.log_player(dev, f"Repeat set to {mode_name}")
+
+    def on_volume_command(self, dev, mac, Command, Level):
+        if Command == "Set Level":
+            self.handle_volume(dev, mac, Level)
+
+    def on_track_command(self, dev, mac, Command, Level):
+        # Text devices (Track / Progress), nothing to control
+        return
+
+    def on_main_command(self, dev, mac, Command, Level):
+        if Command in ["On", "Off"]:
+            self.handle_power(dev, mac, Command)
+        elif Command == "Set Level":
+            self.handle_main_playback(dev, mac, Level)
 
     # ------------------------------------------------------------------
     # Command helpers
     # ------------------------------------------------------------------
     def handle_volume(self, dev, mac, Level):
-        self.send_playercmd(mac, ["mixer", "volume", str(Level)])
+        self.queue_playercmd(mac, ["mixer", "volume", str(Level)])
         dev.Update(nValue=2 if Level > 0 else 0, sValue=str(Level))
         self.log_player(dev, f"Volume {Level}%")
 
@@ -1016,62 +3348,88 @@ class LMSPlugin:
 
         if Level == 20:
             self.log(f"Syncing all players TO master: {mac}")
-            server = self.get_serverstatus()
-            if not server:
+            # Player list of this server from the last poll; the scheduler paces the sync commands
+            players = self.server_for(mac).players
+            if not players:
                 self.log("Serverstatus niet beschikbaar, sync afgebroken.")
                 dev.Update(nValue=0, sValue="0")
                 return
 
-            players = server.get("players_loop", []) or []
             for p in players:
                 pid = p.get("playerid")
                 if pid and pid != mac:
-                    self.send_playercmd(pid, ["sync", mac])
-                    time.sleep(0.1)
+                    self.queue_playercmd(pid, ["sync", mac])
 
             dev.Update(nValue=0, sValue="0")
             return
 
         if Level == 30:
             self.log(f"Unsyncing player: {mac}")
-            self.send_playercmd(mac, ["sync", "-"])
+            self.queue_playercmd(mac, ["sync", "-"])
             dev.Update(nValue=0, sValue="0")
             return
 
+        if Level == 40:
+            self.dump_rpc_trace()
+            dev.Update(nValue=0, sValue="0")
+            return
+
+        if Level == 50:
+            self.start_fade(mac, fade_in=True)
+        elif Level == 60:
+            self.start_fade(mac, fade_in=False)
+        elif Level in self.SLEEP_LEVELS:
+            self.start_sleep_timer(mac, self.SLEEP_LEVELS[Level])
+        elif Level == 100:
+            cancelled = self.timers.cancel((mac, "fade")) | self.timers.cancel((mac, "sleep"))
+            self.log(f"Timers for {mac} {'cancelled' if cancelled else 'not active'}")
+        elif Level == 110:
+            if self.history is None:
+                self.log("Listening history is disabled (set \"history\": true in settings.json)")
+            else:
+                self.flush_history()
+                name = dev.Name.replace(" Actions", "")
+                self.server_for(mac).scheduler.submit(LANE_LOW, self.log_listening_stats, self.history, mac, name)
+
         dev.Update(nValue=0, sValue="0")
 
     def handle_power(self, dev, mac, Command):
         if Command == "On":
-            self.send_playercmd(mac, ["power", "1"])
+            self.queue_playercmd(mac, ["power", "1"])
             dev.Update(nValue=1, sValue=dev.sValue)
             self.log_player(dev, "Power On")
         elif Command == "Off":
-            self.send_playercmd(mac, ["power", "0"])
+            self.queue_playercmd(mac, ["power", "0"])
             dev.Update(nValue=0, sValue="0")
+            self.progress_event(mac, "off")
             self.log_player(dev, "Power Off")
 
     def handle_main_playback(self, dev, mac, Level):
         if Level == 0:
-            self.send_playercmd(mac, ["power", "0"])
+            self.queue_playercmd(mac, ["power", "0"])
             dev.Update(nValue=0, sValue="0")
+            self.progress_event(mac, "off")
             self.log_player(dev, "Power Off")
             return
 
         if Level == 10:
-            self.send_playercmd(mac, ["pause", "1"])
+            self.queue_playercmd(mac, ["pause", "1"])
             dev.Update(nValue=1, sValue="10")
+            self.progress_event(mac, "pause")
             self.log_player(dev, "Pause")
             return
 
         if Level == 20:
-            self.send_playercmd(mac, ["play"])
+            self.queue_playercmd(mac, ["play"])
             dev.Update(nValue=1, sValue="20")
+            self.progress_event(mac, "play")
             self.log_player(dev, "Play")
             return
 
         if Level == 30:
-            self.send_playercmd(mac, ["stop"])
+            self.queue_playercmd(mac, ["stop"])
             dev.Update(nValue=1, sValue="30")
+            self.progress_event(mac, "stop")
             self.log_player(dev, "Stop")
             return
 
@@ -1094,3 +3452,7 @@ def onHeartbeat():
 
 def onCommand(Unit, Command, Level, Hue):
     _plugin.onCommand(Unit, Command, Level, Hue)
+
+
+def onDeviceRemoved(Unit):
+    _plugin.onDeviceRemoved(Unit)